@@ -0,0 +1,161 @@
+# ------------------------------------------------------------
+# Benchmark harness: renders a scene offscreen along a scripted
+# camera path and reports per-stage frame timings
+#
+# Usage: python bench.py [scene] [--frames N] [--json FILE]
+# ------------------------------------------------------------
+import argparse
+import json
+import math
+import time
+
+import engine
+
+STAGES = ("physics", "cull", "project", "sort", "raster", "flip")
+
+
+# ----------------------------------------------------------
+# Returns camera position and rotation for frame of a path
+# orbiting (cx, cz) at radius, always facing the centre
+# ----------------------------------------------------------
+def camera_path(frame, frames, cx, cy, cz, radius):
+    angle = 2 * math.pi * frame / frames
+    x = cx + math.sin(angle) * radius
+    z = cz - math.cos(angle) * radius
+    y = cy + math.sin(angle * 2) * radius * 0.25
+
+    # Pitches camera slightly up and down as it orbits
+    y_rot = math.sin(angle * 2) * 0.2
+    return x, y, z, angle, y_rot
+
+
+# ------------------------------------------
+# Returns p-th percentile of sorted samples
+# ------------------------------------------
+def percentile(samples, p):
+    index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+# Returns planar distance from player to orbit centre
+def dist_to_centre(player, cx, cz):
+    return math.sqrt((player.x - cx) ** 2 + (player.z - cz) ** 2)
+
+
+# Returns mean and percentiles of samples, in milliseconds
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "p50": percentile(ordered, 50) * 1000,
+        "p95": percentile(ordered, 95) * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+# -------------------------------------------------------------
+# Loads scene headless and renders frames, returns result dict
+# -------------------------------------------------------------
+def run_benchmark(scene, frames, width, height, warmup, raster="poly", dirty_rects=True):
+    engine.init_display(width, height, headless=True, raster=raster, dirty_rects=dirty_rects)
+    engine.import_scene(scene)
+
+    # Same spin as the interactive demo, so physics has work to do
+    engine.modelList[0].x_vel_a = 0.007
+    engine.modelList[0].z_vel_a = 0.01
+
+    player = engine.player
+    cx = sum(mod.x for mod in engine.modelList) / len(engine.modelList)
+    cy = player.y
+    cz = sum(mod.z for mod in engine.modelList) / len(engine.modelList)
+    radius = max(1.0, dist_to_centre(player, cx, cz))
+
+    timings = {stage: [] for stage in STAGES}
+    frame_times = []
+    total_polys = 0
+
+    for frame_index in range(warmup + frames):
+        x, y, z, x_rot, y_rot = camera_path(frame_index, frames, cx, cy, cz, radius)
+        player.x, player.y, player.z = x, y, z
+        player.cam.x_rot, player.cam.y_rot = x_rot, y_rot
+        player.update()
+
+        start = time.perf_counter()
+        engine.update_physics()
+        t_physics = time.perf_counter()
+        engine.find_visible_models()
+        t_cull = time.perf_counter()
+        frame = engine.project_models()
+        t_project = time.perf_counter()
+        order = engine.sort_triangles(frame)
+        t_sort = time.perf_counter()
+        poly_count = engine.raster_models(frame, order)
+        engine.draw_hud()
+        t_raster = time.perf_counter()
+        engine.present()
+        end = time.perf_counter()
+
+        if frame_index < warmup:
+            continue
+
+        timings["physics"].append(t_physics - start)
+        timings["cull"].append(t_cull - t_physics)
+        timings["project"].append(t_project - t_cull)
+        timings["sort"].append(t_sort - t_project)
+        timings["raster"].append(t_raster - t_sort)
+        timings["flip"].append(end - t_raster)
+        frame_times.append(end - start)
+        total_polys += poly_count
+
+    total_time = sum(frame_times)
+    result = {
+        "scene": scene,
+        "frames": frames,
+        "resolution": [width, height],
+        "raster": raster,
+        "dirty_rects": dirty_rects,
+        "models": len(engine.modelList),
+        "stages": {},
+        "frame_ms": summarize(frame_times),
+        "fps": frames / total_time,
+        "polys_per_frame": total_polys / frames,
+        "polys_per_sec": total_polys / total_time,
+    }
+    for stage in STAGES:
+        result["stages"][stage] = summarize(timings[stage])
+    return result
+
+
+# Prints result dict as a table
+def report(result):
+    print("Scene: %s  %dx%d  %d models  %d frames  raster: %s" % (
+        result["scene"], result["resolution"][0], result["resolution"][1],
+        result["models"], result["frames"], result["raster"]))
+    print("%-10s %9s %9s %9s %9s" % ("stage", "mean ms", "p50 ms", "p95 ms", "max ms"))
+    rows = list(result["stages"].items()) + [("frame", result["frame_ms"])]
+    for name, stats in rows:
+        print("%-10s %9.3f %9.3f %9.3f %9.3f" % (
+            name, stats["mean"], stats["p50"], stats["p95"], stats["max"]))
+    print("FPS: %.1f  polys/frame: %.1f  polys/sec: %.0f" % (
+        result["fps"], result["polys_per_frame"], result["polys_per_sec"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offscreen render benchmark")
+    parser.add_argument("scene", nargs="?", default="sceneTest", help="scene file in scenes/")
+    parser.add_argument("--frames", type=int, default=600, help="frames to time")
+    parser.add_argument("--warmup", type=int, default=30, help="untimed frames first")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--raster", choices=engine.RASTER_MODES, default="poly", help="raster backend")
+    parser.add_argument("--full-flip", action="store_true", help="clear and flip the whole screen every frame")
+    parser.add_argument("--json", metavar="FILE", help="also write results as JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.scene, args.frames, args.width, args.height, args.warmup,
+                           args.raster, not args.full_flip)
+    report(result)
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(result, out, indent=2)
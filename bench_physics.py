@@ -0,0 +1,104 @@
+# ------------------------------------------------------------
+# Physics stress benchmark: steps thousands of moving unit
+# boxes in a PhysicsWorld with collision, and reports time per
+# step against box count. Boxes are kept at the same density,
+# so a broad phase that scales linearly keeps time per box flat
+#
+# Usage: python bench_physics.py [--boxes 1000 2000 4000 8000]
+# ------------------------------------------------------------
+import argparse
+import json
+import time
+
+import numpy as np
+from physics import PhysicsWorld
+from collision import *
+
+
+# Body with just the row link PhysicsWorld needs
+class Box:
+    body = None
+
+
+# -------------------------------------------------------------
+# Returns world of count unit boxes spread randomly at density
+# boxes per unit volume, moving in random directions
+# -------------------------------------------------------------
+def make_world(count, density, speed, rng):
+    world = PhysicsWorld(drag=0.0, capacity=count)
+    side = (count / density) ** (1 / 3)
+
+    for a in range(count):
+        world.add(Box())
+
+    world.position[:count] = rng.uniform(0, side, (count, 3))
+    world.velocity[:count] = rng.uniform(-speed, speed, (count, 3))
+    world.local_min[:count] = -0.5
+    world.local_max[:count] = 0.5
+    world.solid[:count] = True
+    return world
+
+
+# Returns candidate pairs tested by brute force, for comparison
+def all_pairs(count):
+    return count * (count - 1) // 2
+
+
+# ---------------------------------------------------------------
+# Steps world of count boxes, returns result dict of timings in ms
+# ---------------------------------------------------------------
+def run_benchmark(count, steps, density=0.05, speed=0.05, seed=1):
+    world = make_world(count, density, speed, np.random.default_rng(seed))
+
+    step_times, collide_times, pair_counts = [], [], []
+    for a in range(steps):
+        start = time.perf_counter()
+        world.step()
+        t_step = time.perf_counter()
+        pair_counts.append(collide_bodies(world))
+        end = time.perf_counter()
+
+        step_times.append(t_step - start)
+        collide_times.append(end - t_step)
+
+    # Overlaps left after resolving, should be few
+    mins, maxs = world_boxes(world, np.arange(world.count))
+    remaining = len(overlapping_pairs(mins, maxs)[0])
+
+    collide_ms = sum(collide_times) / steps * 1000
+    return {
+        "boxes": count,
+        "steps": steps,
+        "step_ms": sum(step_times) / steps * 1000,
+        "collide_ms": collide_ms,
+        "collide_us_per_box": collide_ms * 1000 / count,
+        "contacts_per_step": sum(pair_counts) / steps,
+        "overlaps_after": remaining,
+        "brute_force_pairs": all_pairs(count),
+    }
+
+
+# Prints result dicts as a table
+def report(results):
+    print("%8s %10s %12s %12s %10s %10s %14s" % (
+        "boxes", "step ms", "collide ms", "us per box", "contacts", "overlaps", "all pairs"))
+    for result in results:
+        print("%8d %10.3f %12.3f %12.3f %10.1f %10d %14d" % (
+            result["boxes"], result["step_ms"], result["collide_ms"], result["collide_us_per_box"],
+            result["contacts_per_step"], result["overlaps_after"], result["brute_force_pairs"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Physics and collision stress benchmark")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[1000, 2000, 4000, 8000],
+                        help="box counts to run")
+    parser.add_argument("--steps", type=int, default=120, help="physics steps per run")
+    parser.add_argument("--json", metavar="FILE", help="also write results as JSON")
+    args = parser.parse_args()
+
+    results = [run_benchmark(count, args.steps) for count in args.boxes]
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=2)
@@ -0,0 +1,182 @@
+# ------------------------------------------------------------
+# Module for collision between axis-aligned bounding boxes.
+# Solid bodies of a PhysicsWorld are paired up through a uniform
+# grid, then overlapping pairs are pushed apart along the axis
+# they overlap least on
+# ------------------------------------------------------------
+import numpy as np
+from funcbatch import transform_matrices
+
+
+# ------------------------------------------------------------
+# Returns world space AABB corners (mins, maxs) of world rows,
+# as (R, 3) arrays. Each body's model space box is rotated and
+# scaled, then boxed again so it stays axis-aligned
+# ------------------------------------------------------------
+def world_boxes(world, rows):
+    state = np.column_stack((world.position[rows], world.rotation[rows], world.scale[rows]))
+    matrices = transform_matrices(state)
+
+    local_center = (world.local_min[rows] + world.local_max[rows]) / 2
+    local_half = (world.local_max[rows] - world.local_min[rows]) / 2
+
+    center = np.einsum("nij,nj->ni", matrices[:, :, :3], local_center) + matrices[:, :, 3]
+    half = np.einsum("nij,nj->ni", np.abs(matrices[:, :, :3]), local_half)
+    return center - half, center + half
+
+
+# Cell offsets after (0, 0, 0) in x, y, z order, so each pair of neighbouring cells is visited once
+FORWARD_CELLS = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)
+                 if (i, j, k) > (0, 0, 0)]
+
+
+# ------------------------------------------------------------
+# Returns arrays (first, second) pairing each sorted key with
+# the sorted keys in [lo, hi), for vectorized pair expansion
+# ------------------------------------------------------------
+def expand_ranges(lo, hi):
+    counts = np.maximum(hi - lo, 0)
+    first = np.repeat(np.arange(len(lo)), counts)
+    second = np.repeat(lo, counts) + np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return first, second
+
+
+# -------------------------------------------------------------
+# Returns index arrays (a, b) of boxes whose low corners mins are
+# in the same or neighbouring cells of a grid, each pair once
+# -------------------------------------------------------------
+def grid_pairs(mins, cell_size):
+    if len(mins) < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    # Packs cell of each box into one key, padded so neighbours never wrap
+    cells = np.floor(mins / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    # Same cell: boxes after this one in its run of equal keys
+    first, second = expand_ranges(np.arange(len(keys)) + 1, np.searchsorted(keys, keys, side="right"))
+    pairs_a, pairs_b = [first], [second]
+
+    for i, j, k in FORWARD_CELLS:
+        neighbour = keys + (i * dims[1] + j) * dims[2] + k
+        first, second = expand_ranges(np.searchsorted(keys, neighbour, side="left"),
+                                      np.searchsorted(keys, neighbour, side="right"))
+        pairs_a.append(first)
+        pairs_b.append(second)
+
+    return order[np.concatenate(pairs_a)], order[np.concatenate(pairs_b)]
+
+
+# -------------------------------------------------------------
+# Returns index arrays (a, b) of every pair of overlapping boxes,
+# each pair once. Broad phase is a uniform grid with cells twice
+# the median box size: a box is hashed by the cell of its low
+# corner, so it can only meet boxes in the same or a neighbouring
+# cell. Boxes bigger than a cell are tested against every box
+# -------------------------------------------------------------
+def overlapping_pairs(mins, maxs):
+    count = len(mins)
+    if count < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    extent = (maxs - mins).max(axis=1)
+    cell_size = 2 * float(np.median(extent)) or 1.0
+    big = extent > cell_size
+    small = np.flatnonzero(~big)
+
+    a, b = grid_pairs(mins[small], cell_size)
+    a, b = [small[a]], [small[b]]
+
+    # Big boxes against every small box and every big box after them
+    big = np.flatnonzero(big)
+    for index in big:
+        others = np.concatenate((small, big[big > index]))
+        a.append(np.full(len(others), index))
+        b.append(others)
+
+    a, b = np.concatenate(a), np.concatenate(b)
+    overlap = ((mins[a] < maxs[b]) & (mins[b] < maxs[a])).all(axis=1)
+    return a[overlap], b[overlap]
+
+
+# ----------------------------------------------------------------
+# Returns (axis, push) for pairs of overlapping boxes: the axis
+# each pair overlaps least on, and the signed distance to move box
+# a along it so the pair no longer overlaps
+# ----------------------------------------------------------------
+def separation(mins_a, maxs_a, mins_b, maxs_b):
+    push_up = maxs_b - mins_a  # Moving a towards +axis
+    push_down = maxs_a - mins_b  # Moving a towards -axis
+    depth = np.minimum(push_up, push_down)
+
+    axis = depth.argmin(axis=1)
+    pairs = np.arange(len(axis))
+    push = np.where(push_up < push_down, push_up, -push_down)[pairs, axis]
+    return axis, push
+
+
+# -------------------------------------------------------------
+# Pushes apart overlapping solid bodies of world, returns count
+# of overlapping pairs. Only moving bodies are pushed: a moving
+# body hitting a resting one takes the whole push, two moving
+# bodies take half each. Velocity into the other body is lost
+# -------------------------------------------------------------
+def collide_bodies(world):
+    rows = np.flatnonzero(world.solid[:world.count])
+    mins, maxs = world_boxes(world, rows)
+    a, b = overlapping_pairs(mins, maxs)
+    if len(a) == 0:
+        return 0
+
+    axis, push = separation(mins[a], maxs[a], mins[b], maxs[b])
+    row_a, row_b = rows[a], rows[b]
+
+    moving_a = world.velocity[row_a].any(axis=1)
+    moving_b = world.velocity[row_b].any(axis=1)
+    share_a = np.where(moving_b, 0.5, 1.0) * moving_a
+    share_b = np.where(moving_a, 0.5, 1.0) * moving_b
+
+    # Bodies in several pairs sum their pushes
+    correction = np.zeros((world.count, 3))
+    np.add.at(correction, (row_a, axis), push * share_a)
+    np.add.at(correction, (row_b, axis), -push * share_b)
+
+    # Stops velocity heading into the other body
+    vel_a = world.velocity[row_a, axis]
+    vel_b = world.velocity[row_b, axis]
+    stop_a = (share_a > 0) & (vel_a * push < 0)
+    stop_b = (share_b > 0) & (vel_b * push > 0)
+    world.velocity[row_a[stop_a], axis[stop_a]] = 0
+    world.velocity[row_b[stop_b], axis[stop_b]] = 0
+
+    pushed = np.flatnonzero(correction.any(axis=1))
+    world.position[pushed] += correction[pushed]
+    world.version[pushed] += 1
+    world.moved[pushed] = True
+    return len(a)
+
+
+# ------------------------------------------------------------
+# Returns (dx, dy, dz) moving box (box_min, box_max) out of the
+# boxes (mins, maxs) it overlaps, one box at a time along the
+# axis it overlaps least on
+# ------------------------------------------------------------
+def push_out(box_min, box_max, mins, maxs):
+    box_min = np.array(box_min, dtype=np.float64)
+    box_max = np.array(box_max, dtype=np.float64)
+    offset = np.zeros(3)
+
+    for other_min, other_max in zip(mins, maxs):
+        if not ((box_min < other_max) & (other_min < box_max)).all():
+            continue
+        axis, push = separation(box_min[None], box_max[None], other_min[None], other_max[None])
+        offset[axis[0]] += push[0]
+        box_min[axis[0]] += push[0]
+        box_max[axis[0]] += push[0]
+
+    return offset
@@ -0,0 +1,120 @@
+# ------------------------------------------------------------
+# Module for dirty rectangle tracking. The screen is split into
+# square tiles, and each frame marks the tiles its triangles and
+# HUD elements cover. Only tiles drawn last frame or this frame
+# need clearing and presenting, so a small model spinning on an
+# empty screen costs a few tiles instead of every pixel
+# ------------------------------------------------------------
+import numpy as np
+import pygame as pyg
+
+DIRTY_TILE = 32  # Size of a tracked tile, in pixels
+DIRTY_FLIP_COVERAGE = 0.5  # Above this fraction of tiles dirty, the whole screen is cleared and flipped
+
+
+# -------------------------------------------------------------
+# DIRTY REGIONS CLASS: Tile masks of the screen covered by the
+# previous and current frame. Call next_frame before marking a
+# new frame. Everything starts dirty, so the first frame is
+# drawn whole
+# -------------------------------------------------------------
+class DirtyRegions:
+    def __init__(self, width, height, tile=DIRTY_TILE):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.rows = -(-height // tile)
+        self.cols = -(-width // tile)
+
+        self.previous = np.ones((self.rows, self.cols), dtype=bool)  # Tiles drawn last frame
+        self.current = np.zeros((self.rows, self.cols), dtype=bool)  # Tiles drawn this frame
+
+    # Starts a new frame, tiles of the current one become the previous
+    def next_frame(self):
+        self.previous = self.current
+        self.current = np.zeros((self.rows, self.cols), dtype=bool)
+
+    # Marks the whole screen, for frames drawn over everything
+    def invalidate(self):
+        self.current[:] = True
+
+    # ------------------------------------------------------------
+    # Marks tiles overlapped by boxes [x1, x2) x [y1, y2) given as
+    # arrays of pixel bounds. Corners are counted into a summed
+    # area table, so any number of boxes costs a few array passes
+    # ------------------------------------------------------------
+    def add_boxes(self, x1, y1, x2, y2):
+        x1, x2 = np.clip(x1, 0, self.width).astype(np.intp), np.clip(x2, 0, self.width).astype(np.intp)
+        y1, y2 = np.clip(y1, 0, self.height).astype(np.intp), np.clip(y2, 0, self.height).astype(np.intp)
+        keep = (x1 < x2) & (y1 < y2)
+        if not keep.any():
+            return
+
+        tile = self.tile
+        tx1, ty1 = x1[keep] // tile, y1[keep] // tile
+        tx2, ty2 = (x2[keep] - 1) // tile + 1, (y2[keep] - 1) // tile + 1
+
+        stride = self.cols + 1
+        corners = np.concatenate((ty1 * stride + tx1, ty1 * stride + tx2, ty2 * stride + tx1, ty2 * stride + tx2))
+        weights = np.repeat((1, -1, -1, 1), len(tx1))
+        counts = np.bincount(corners, weights, (self.rows + 1) * stride).reshape(self.rows + 1, stride)
+        self.current |= counts.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+    # Marks tiles under (T, 6) screen triangles, padded a pixel for polygon edges
+    def add_triangles(self, points):
+        if len(points) == 0:
+            return
+        xs, ys = points[:, 0::2], points[:, 1::2]
+        self.add_boxes(np.floor(xs.min(axis=1)) - 1, np.floor(ys.min(axis=1)) - 1,
+                       np.ceil(xs.max(axis=1)) + 2, np.ceil(ys.max(axis=1)) + 2)
+
+    # Marks tiles under one pygame Rect
+    def add_rect(self, rect):
+        x, y, w, h = rect
+        if w <= 0 or h <= 0:
+            return
+        tile = self.tile
+        self.current[max(y // tile, 0):max(-(-(y + h) // tile), 0),
+                     max(x // tile, 0):max(-(-(x + w) // tile), 0)] = True
+
+    # Returns mask of tiles to clear and present, drawn last frame or this one
+    def dirty(self):
+        return self.previous | self.current
+
+    # Returns fraction of screen tiles set in mask
+    def coverage(self, mask):
+        return np.count_nonzero(mask) / mask.size
+
+    # ------------------------------------------------------------
+    # Returns list of pygame Rects covering the tiles of mask, runs
+    # of tiles along each row merged, and equal runs of rows below
+    # merged into one taller rect, clipped to the screen
+    # ------------------------------------------------------------
+    def rects(self, mask):
+        tile = self.tile
+        edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+
+        # Run starts and ends of every row at once, row major so they pair up in order
+        rows, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+
+        rects = []
+        open_runs = {}  # (first col, end col): index in rects of the run in the row above
+        runs = {}
+        last_row = -1
+        for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+            if row != last_row:
+                open_runs = runs if row == last_row + 1 else {}
+                runs = {}
+                last_row = row
+
+            index = open_runs.get((start, end))
+            if index is None:
+                index = len(rects)
+                rects.append([start, row, end, row + 1])
+            else:
+                rects[index][3] = row + 1
+            runs[start, end] = index
+
+        return [pyg.Rect(x1 * tile, y1 * tile, min(x2 * tile, self.width) - x1 * tile,
+                         min(y2 * tile, self.height) - y1 * tile) for x1, y1, x2, y2 in rects]
@@ -0,0 +1,983 @@
+# ------------------------------------------------------------
+# Module holding the engine classes and the per-frame render
+# stages. Importing it opens no window, call init_display first
+# ------------------------------------------------------------
+import math
+import os
+import sys
+
+import numpy as np
+import pygame as pyg
+from funcmath import *
+from funcmodel import *
+from funcbatch import *
+from mesh import *
+from spatial import *
+from raster import *
+from scheduler import *
+from physics import *
+from collision import *
+from lod import *
+from scenefile import *
+from streaming import *
+from instancing import *
+from profiler import *
+from lighting import *
+from dirtyrect import *
+from glyphcache import *
+
+DEBUG_MODE = False  # Global, debug mode enabled?
+PROFILE_HUD = False  # Global, frame profiler panel shown?
+TRACE_FILE = "profile_trace.csv"  # Written when a trace recording is stopped, .json for JSON
+MOUSE_MOVE = False  # Global, is mouse look enabled?
+MOUSE_SENS = 0.002  # Global, mouse sensitivity
+
+phys_drag = 0.0002  # Air Resistance present in scene, velocity lost per physics step
+
+# Fallback res if full-screen not found
+SCREEN_WIDTH, SCREEN_HEIGHT = 720, 480
+
+HALF_SCREEN_W = int(SCREEN_WIDTH / 2)
+HALF_SCREEN_H = int(SCREEN_HEIGHT / 2)
+
+HEADLESS = False  # Global, rendering offscreen with the SDL dummy driver?
+
+RASTER_MODES = ("poly", "zbuffer")  # Raster backends selectable in init_display
+RASTER_MODE = "poly"  # Global, current raster backend
+DIRTY_RECTS = True  # Global, clear and present only screen tiles drawn this frame or the last?
+
+# ---- Creating Color Constants ----
+C_WHITE = (255, 255, 255)
+C_BLACK = (0, 0, 0)
+C_GREEN = (0, 255, 0)
+C_BLUE = (0, 0, 255)
+C_RED = (255, 0, 0)
+C_CYAN = (0, 255, 255)
+
+screen_bgc = (C_BLACK)
+
+screen = None  # Surface that holds screen gfx, set by init_display
+raster_buffer = None  # ZBufferRaster, when RASTER_MODE is "zbuffer"
+screen_regions = None  # DirtyRegions of the screen, when DIRTY_RECTS is set
+full_redraw = True  # Is the current frame cleared and flipped whole?
+font = None  # HUD font, set by init_display
+glyph_cache = None  # GlyphCache drawing HUD text in font, set by init_display
+
+
+# ---------------------------------------------------------------
+# PyGame Initialization Code
+# headless: renders into an offscreen surface using the SDL dummy
+# video driver, no window is opened and input is not grabbed
+# raster: "poly" draws each triangle with pygame.draw.polygon in
+# painter's order, "zbuffer" fills NumPy color and depth buffers
+# for per-pixel occlusion (slower than "poly", see raster.py)
+# dirty_rects: clear and present only the screen areas drawn
+# this frame or the last, see dirtyrect.py
+# ---------------------------------------------------------------
+def init_display(width, height, headless=False, raster="poly", dirty_rects=True):
+    global SCREEN_WIDTH, SCREEN_HEIGHT, HALF_SCREEN_W, HALF_SCREEN_H, DIRTY_RECTS
+    global HEADLESS, RASTER_MODE, screen, font, glyph_cache, raster_buffer, screen_regions
+
+    if raster not in RASTER_MODES:
+        raise ValueError("Unknown raster mode: %s" % raster)
+    RASTER_MODE = raster
+
+    SCREEN_WIDTH, SCREEN_HEIGHT = width, height
+    HALF_SCREEN_W = int(SCREEN_WIDTH / 2)
+    HALF_SCREEN_H = int(SCREEN_HEIGHT / 2)
+    HEADLESS = headless
+    player.cam.set_screen(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    # Video driver must be chosen before the display is initialized
+    if headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+    pyg.init()
+    pyg.display.init()
+    pyg.font.init()
+
+    font = pyg.font.Font(None, 32)
+    glyph_cache = GlyphCache(font, C_WHITE)
+
+    if headless:
+        screen = pyg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    else:
+        pyg.display.set_caption("3D Renderer")
+
+        scr_flags = pyg.FULLSCREEN | pyg.DOUBLEBUF  # Screen flag parameters
+        screen = pyg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), scr_flags)
+
+        pyg.mouse.set_visible(False)
+        pyg.event.set_grab(True)
+
+    if RASTER_MODE == "zbuffer":
+        raster_buffer = ZBufferRaster(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    DIRTY_RECTS = dirty_rects
+    screen_regions = DirtyRegions(SCREEN_WIDTH, SCREEN_HEIGHT) if dirty_rects else None
+
+    return screen
+
+
+modelList = []  # List of all currently loaded models
+batchList = []  # InstanceBatches of the scene, copies of one mesh drawn without a Model each
+scene_lights = SceneLights()  # Lights of the scene, faces are drawn unlit when it has none
+scene_grid = UniformGrid()  # Spatial index of modelList, for view and nearby queries
+visible_models = []  # Models near the view frustum this frame
+
+models_drawn = 0  # Models that passed frustum culling last frame
+models_culled = 0  # Models skipped by frustum culling last frame
+instances_drawn = 0  # Copies in instance batches that passed frustum culling last frame
+
+cache_hits = 0  # Models whose cached projection was reused last frame
+cache_misses = 0  # Models projected again last frame
+last_frame = ([], None)  # (model triangle lists, frame) returned by project_models
+last_sort = (None, None)  # (frame, order) of last sort_triangles
+last_raster = (None, None)  # (frame, screen copy or None) of last raster_models
+
+frame_scheduler = None  # FrameScheduler of run(), frames draw its blended transforms when set
+physics_world = PhysicsWorld(phys_drag)  # Transform and velocity arrays of every Model
+contacts = 0  # Overlapping solid model pairs found by the last physics step
+profiler = FrameProfiler()  # Stage timings of run(), shown by draw_profile
+scene_streamer = None  # SceneStreamer of stream_scene, loads cells of the scene around the player
+
+
+# ---------------------------------
+# Handles all event and game logic
+# ---------------------------------
+def event_handler(event):
+    if event.type == pyg.QUIT:
+        pyg.quit()
+        sys.exit()
+
+    # Handles key press events
+    if event.type == pyg.KEYDOWN:
+        if event.key == pyg.K_ESCAPE:
+            pyg.quit()
+            sys.exit()
+
+        if event.key == pyg.K_1:
+            global DEBUG_MODE
+            if DEBUG_MODE:
+                DEBUG_MODE = False
+                print("Debug Mode Disabled")
+            else:
+                DEBUG_MODE = True
+                print("Debug Mode Enabled")
+
+        if event.key == pyg.K_2:
+            global PROFILE_HUD
+            PROFILE_HUD = not PROFILE_HUD
+
+        # Starts recording a per-frame trace, or stops and writes it
+        if event.key == pyg.K_3:
+            if profiler.trace is None:
+                profiler.start_trace()
+                print("Recording frame trace")
+            else:
+                frames = profiler.write_trace(TRACE_FILE)
+                print("Wrote %d frames to %s" % (frames, TRACE_FILE))
+
+
+# Removes every model, and stops streaming the last scene
+def clear_scene():
+    global modelList, batchList, scene_streamer
+    if scene_streamer is not None:
+        scene_streamer.close(unload=False)
+        scene_streamer = None
+
+    modelList = []
+    batchList = []
+    scene_lights.clear()
+    scene_grid.clear()
+    physics_world.clear()
+
+
+# Adds InstanceBatch drawing copies of model file name at (N, 7) transform rows
+def add_instances(name, transforms):
+    batch = InstanceBatch(mesh_cache.get(name), transforms)
+    batchList.append(batch)
+    return batch
+
+
+# Creates solid model of one scene placement, see parse_scene
+def place_model(name, x, y, z, x_rot, y_rot, z_rot, model_scale):
+    model = Model(x, y, z, x_rot, y_rot, z_rot, name, True)
+    scale(model, model_scale)
+    scene_grid.update(model)
+    return model
+
+
+# ----------------------------------------------
+# Clears model list, loads scene into modelList
+# ----------------------------------------------
+def import_scene(file_name):
+    clear_scene()
+
+    (x, y, z), placements, instances, lights = parse_scene(load_file(file_name, SCENE_PATH))
+    translate(player, x, y, z)
+
+    for light in lights:
+        scene_lights.add(*light)
+
+    for placement in placements:
+        place_model(*placement)
+    for name, transforms in instances.items():
+        add_instances(name, transforms)
+
+
+# Reads model files of a streamed cell on the loader thread
+def preload_models(names):
+    for name in names:
+        mesh_cache.get(name)
+
+
+# -------------------------------------------------------------
+# Clears model list and streams scene in around the player,
+# from its indexed binary file (converted from the text scene
+# when stale, see scenefile.py). Only cells within load_radius
+# are loaded, default render distance, and cells are unloaded
+# again once the player leaves them behind. Instance batches
+# are loaded whole. wait: block until
+# the cells around the start position are loaded
+# -------------------------------------------------------------
+def stream_scene(file_name, load_radius=None, unload_radius=None, wait=True):
+    global scene_streamer
+    clear_scene()
+
+    scene = open_scene(file_name)
+    translate(player, *scene.player)
+
+    for light in scene.lights():
+        scene_lights.add(*light)
+
+    # Instance batches are only rows of floats, so they are all loaded up front
+    for name, transforms in scene.instances().items():
+        add_instances(name, transforms)
+
+    if load_radius is None:
+        load_radius = player.cam.render_distance
+    scene_streamer = SceneStreamer(scene, lambda placement: place_model(*placement), Model.del_model,
+                                   load_radius, unload_radius, preload_models)
+    scene_streamer.update(player.x, player.y, player.z)
+    if wait:
+        scene_streamer.wait()
+    return scene_streamer
+
+
+# --------------------------------------------------
+# Draws debug info to screen if DEBUG_MODE == True
+# --------------------------------------------------
+def debug():
+
+    if DEBUG_MODE:
+        HUD.text(10, 10, "Models drawn: %d  culled: %d  instances: %d  contacts: %d" % (
+            models_drawn, models_culled, instances_drawn, contacts))
+
+        # Nearest model under the cross-hair
+        cam = player.cam
+        forward = cam.view_matrix[2, :3]
+        target, target_dist = scene_grid.raycast((cam.x, cam.y, cam.z), forward, cam.render_distance)
+        if target is not None:
+            HUD.text(10, 40, "Target: %s (%.1f)" % (target.model_name, target_dist))
+
+        HUD.text(10, 70, "Render cache hits: %d  misses: %d" % (cache_hits, cache_misses))
+
+    # Drawing vertice IDs to Screen, from the points projected for this frame
+    if DEBUG_MODE:
+        xs, ys, ids = [], [], []
+        for model in visible_models:
+            points = model.screen_points
+            if points is None:
+                continue
+            x, y = points[:, 0] + HALF_SCREEN_W, points[:, 1] + HALF_SCREEN_H
+            shown = ((points[:, 2] > 0) & (points[:, 2] < math.inf) &
+                     (x >= 0) & (x < SCREEN_WIDTH) & (y >= 0) & (y < SCREEN_HEIGHT))
+            vertice_ids = np.flatnonzero(shown)
+            xs.append(x[vertice_ids])
+            ys.append(y[vertice_ids])
+            ids.append(vertice_ids)
+
+        if ids:
+            HUD.numbers(np.concatenate(xs), np.concatenate(ys), np.concatenate(ids))
+
+
+# ----------------------------------------------------------
+# Draws frame profiler panel: mean and percentile time of
+# each stage over the last PROFILE_HISTORY frames, in ms
+# ----------------------------------------------------------
+def draw_profile():
+    stats = profiler.stats()
+    rows = profiler.stages + ("frame",)
+
+    line_h, width = 22, 420
+    x, y = SCREEN_WIDTH - width - 10, 10
+    HUD.rect(x, y, width, line_h * (len(rows) + 1) + 10)
+
+    # Columns drawn at fixed offsets, the HUD font isn't monospaced
+    columns = ("mean", "p50", "p95", "max")
+    HUD.text(x + 8, y + 6, "stage")
+    for b, column in enumerate(columns):
+        HUD.text(x + 120 + b * 75, y + 6, column)
+
+    for a, stage in enumerate(rows):
+        row_y = y + 6 + line_h * (a + 1)
+        HUD.text(x + 8, row_y, stage)
+        for b, column in enumerate(columns):
+            HUD.text(x + 120 + b * 75, row_y, "%.2f" % stats[stage][column])
+    if profiler.trace is not None:
+        HUD.text(x + 8, y + line_h * (len(rows) + 1) + 14, "Recording trace: %d frames" % len(profiler.trace))
+
+
+# -------------------------------------------------------
+# PLAYER CLASS: Acts as event handler for player input,
+# as well as controlling player and camera movement
+# -------------------------------------------------------
+class Player:
+    def __init__(self, x, y, z):
+
+        self.x = x
+        self.y = y
+        self.z = z
+
+        self.move_speed = 0.05
+        self.size = 0.25  # Half width of player collision box
+
+        self.cam = Camera(x, y, z, 0, 0, 0)
+
+    def key_update(self):
+        key = pyg.key.get_pressed()
+
+        # Forward / Backward movement
+        if key[pyg.K_w]:
+            self.x += clamp(length_dir_x(self.move_speed, self.cam.x_rot), 0, self.move_speed)
+            self.y += clamp(length_dir_y(self.move_speed, self.cam.y_rot), 0, self.move_speed)
+            self.z += clamp(length_dir_z(self.move_speed, self.cam.x_rot), 0, self.move_speed)
+        if key[pyg.K_s]:
+            self.x -= clamp(length_dir_x(self.move_speed, self.cam.x_rot), 0, self.move_speed)
+            self.y -= clamp(length_dir_y(self.move_speed, self.cam.y_rot), 0, self.move_speed)
+            self.z -= clamp(length_dir_z(self.move_speed, self.cam.x_rot), 0, self.move_speed)
+
+        # Strafing Left and Right
+        if key[pyg.K_a]:
+            self.x += length_dir_x(self.move_speed, self.cam.x_rot + math.pi / 2)
+            self.z += length_dir_z(self.move_speed, self.cam.x_rot + math.pi / 2)
+        if key[pyg.K_d]:
+            self.x += length_dir_x(self.move_speed, self.cam.x_rot - math.pi / 2)
+            self.z += length_dir_z(self.move_speed, self.cam.x_rot - math.pi / 2)
+
+        # Turning Camera using arrow keys
+        if key[pyg.K_LEFT]:
+            self.cam.rotate_camera(0.015, 0, 0)
+        if key[pyg.K_RIGHT]:
+            self.cam.rotate_camera(-0.015, 0, 0)
+        if key[pyg.K_UP]:
+            self.cam.rotate_camera(0, 0.015, 0)
+        if key[pyg.K_DOWN]:
+            self.cam.rotate_camera(0, -0.015, 0)
+
+        # Moving Up and Down
+        if key[pyg.K_SPACE]:
+            transform(self, 0, -self.move_speed, 0)
+        if key[pyg.K_LSHIFT]:
+            transform(self, 0, self.move_speed, 0)
+
+    # Moves player out of any solid model it walked into
+    def collide(self):
+        rows = [mod.body for mod in scene_grid.query_sphere(self.x, self.y, self.z, self.size) if mod.solid]
+        if not rows:
+            return
+
+        size = self.size
+        mins, maxs = world_boxes(physics_world, rows)
+        box_min = (self.x - size, self.y - size, self.z - size)
+        box_max = (self.x + size, self.y + size, self.z + size)
+        dx, dy, dz = push_out(box_min, box_max, mins, maxs)
+        transform(self, dx, dy, dz)
+
+    def update(self):
+
+        # Translates camera every frame
+        translate(self.cam, self.x, self.y, self.z)
+
+        if(MOUSE_MOVE):
+            # Rotating camera via mouse movement
+            mouse_move_x, mouse_move_y = pyg.mouse.get_rel()
+            mouse_move_x *= MOUSE_SENS
+            mouse_move_y *= MOUSE_SENS
+
+            self.cam.rotate_camera(-mouse_move_x, -mouse_move_y, 0)
+
+        # Locking Y Rotation to +1.5 and -1.5
+        if self.cam.y_rot < -1.5:
+            self.cam.y_rot = -1.5
+        if self.cam.y_rot > 1.5:
+            self.cam.y_rot = 1.5
+
+        self.cam.update()
+
+
+# ---------------------------------------------------------
+# MODEL CLASS: Each currently loaded model is it's own
+# model object, a view of its row in physics_world holding
+# all positional, rotational and velocity data
+# ---------------------------------------------------------
+class Model:
+
+    x = BodyProperty("position", 0, True)  # Model 3D X Position
+    y = BodyProperty("position", 1, True)  # Model 3D Y Position
+    z = BodyProperty("position", 2, True)  # Model 3D Z Position
+
+    x_rot = BodyProperty("rotation", 0, True)  # Model X-Axis rotation
+    y_rot = BodyProperty("rotation", 1, True)  # Model Y-Axis rotation
+    z_rot = BodyProperty("rotation", 2, True)  # Model Z-Axis rotation
+
+    scale = BodyProperty("scale", None, True)  # Model scale, set by import_scene
+
+    x_vel = BodyProperty("velocity", 0)  # Current Model X Velocity
+    y_vel = BodyProperty("velocity", 1)  # Current Model Y Velocity
+    z_vel = BodyProperty("velocity", 2)  # Current Model Z Velocity
+
+    x_vel_a = BodyProperty("angular", 0)  # Current Model Angular X Velocity
+    y_vel_a = BodyProperty("angular", 1)  # Current Model Angular Y Velocity
+    z_vel_a = BodyProperty("angular", 2)  # Current Model Angular Z Velocity
+
+    drag = BodyProperty("drags")  # Velocity lost per physics step, phys_drag by default
+    solid = BodyProperty("solid")  # Boolean, if model has AABB enabled
+
+    def __init__(self, x, y, z, xrot, yrot, zrot, modelname, solid):
+        self._matrix = None  # Cached model-to-world matrix
+        self._matrix_version = -1  # Transform version _matrix was built from
+
+        # Mesh is loaded before the body is added, so a missing or malformed file leaves no row behind
+        self.model_name = modelname  # Name of Model File
+        self.mesh = mesh_cache.get(modelname)  # Shared geometry of model file, see mesh.py
+        self.lod_level = 0  # Index of mesh.lods drawn, picked each frame by find_visible_models
+
+        self.world = physics_world
+        self.body = None  # Row in physics_world, set by add
+        physics_world.add(self)
+        self.fit_body()
+
+        self.x, self.y, self.z = x, y, z
+        self.x_rot, self.y_rot, self.z_rot = xrot, yrot, zrot
+        self.solid = solid
+
+        self.distance = 0  # Distance to camera
+
+        self.grid_cell = None  # Key of scene_grid cell holding model
+        scene_grid.insert(self)
+        self.world.cells[self.body] = self.grid_cell
+
+        self.render_cache = None  # (key, projected triangles) of last projection, see project_models
+        self.screen_points = None  # Projected vertices of last projection, None if culled
+
+        modelList.append(self)
+
+    # Unloads model from memory
+    def del_model(self):
+        scene_grid.remove(self)
+        physics_world.remove(self)
+        modelList.remove(self)
+        del self
+
+    # Returns cached 3x4 model-to-world matrix, rebuilt only after the transform changes
+    def get_matrix(self):
+        version = self.world.version[self.body]
+        matrix = self._matrix
+        if matrix is None or self._matrix_version != version:
+            matrix = model_matrix(self)
+            self._matrix, self._matrix_version = matrix, version
+        return matrix
+
+    # Returns key that changes whenever frame_matrix changes
+    def frame_version(self):
+        if frame_scheduler is not None:
+            version = frame_scheduler.frame_version(self)
+            if version is not None:
+                return version
+        return int(self.world.version[self.body])
+
+    # Returns model matrix to draw this frame with, blended between physics steps
+    def frame_matrix(self):
+        if frame_scheduler is not None:
+            matrix = frame_scheduler.model_matrix(self)
+            if matrix is not None:
+                return matrix
+        return self.get_matrix()
+
+    # Returns world space center of mesh bounding sphere
+    def sphere_center(self):
+        matrix = self.get_matrix()
+        return matrix[:, :3] @ self.mesh.center + matrix[:, 3]
+
+    # Rest-pose vertices rotated and scaled into model space, not translated
+    @property
+    def vertices(self):
+        matrix = self.get_matrix()
+        return self.rest_vertices @ matrix[:, :3].T
+
+    # Fetches shared mesh of model file, parsed once for every model using it
+    def import_model(self, file_name):
+        self.mesh = mesh_cache.get(file_name)
+        self.lod_level = 0
+        self.fit_body()
+
+    # Sets collision box of body to the bounding box of mesh
+    def fit_body(self):
+        self.world.local_min[self.body] = self.mesh.aabb_min
+        self.world.local_max[self.body] = self.mesh.aabb_max
+
+    # Rest-pose vertices of shared mesh at current LOD level, read-only (N, 3) float array
+    @property
+    def rest_vertices(self):
+        return self.mesh.lods[self.lod_level].vertices
+
+    # Faces of shared mesh at current LOD level, read-only (M, 6) int array
+    # faces[vertID1, vertID2, vertID3, r, g, b]
+    @property
+    def faces(self):
+        return self.mesh.lods[self.lod_level].faces
+
+
+# ---------------------------------------------------------
+# Camera transform attribute, setting it to a new value
+# bumps the owning camera's version so cached projections
+# made from the old transform aren't used again
+# ---------------------------------------------------------
+class VersionedProperty:
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        if obj.__dict__.get(self.name) != value:
+            obj.__dict__[self.name] = value
+            obj.version += 1
+
+
+# --------------------------------------------
+# CAMERA CLASS: Acts as a view port for world
+# renders 3D-Space objects to 2D screen
+# --------------------------------------------
+class Camera:
+
+    x = VersionedProperty()
+    y = VersionedProperty()
+    z = VersionedProperty()
+    x_rot = VersionedProperty()
+    y_rot = VersionedProperty()
+    z_rot = VersionedProperty()
+    render_distance = VersionedProperty()
+
+    def __init__(self, x, y, z, xrot, yrot, zrot):
+        self.version = 0  # Bumped whenever position or rotation changes
+
+        self.x = x
+        self.y = y
+        self.z = z
+
+        self.x_rot = xrot  # Current camera X-Axis rotation
+        self.y_rot = yrot  # Current camera Y-Axis rotation
+        self.z_rot = zrot  # Current camera Z-Axis rotation
+
+        self.render_distance = 50  # How far models are rendered
+
+        self.target = None  # Current object target
+
+        self._view = None  # Cached 3x4 view matrix
+        self._view_version = -1  # Camera version _view was built from
+        self.set_screen(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    # Turns camera towards target, then builds the view matrix for the frame
+    def update(self):
+
+        if self.target is not None:
+            self.look_at(*get_coords(self.target))
+
+        self.build_view()
+
+    # Returns cached view matrix, rebuilt only once the camera has changed
+    def build_view(self):
+        view = self._view
+        if self._view_version != self.version:
+            view = view_matrix(self)
+            self._view, self._view_version = view, self.version
+        return view
+
+    # 3x4 world to camera space matrix
+    @property
+    def view_matrix(self):
+        return self.build_view()
+
+    # Sets projection parameters for screen size, points project to focal * (x, y) / z
+    def set_screen(self, width, height):
+        self.half_w = width / 2
+        self.half_h = height / 2
+        self.focal = width / 2
+
+    # Turns camera to face a point, keeping roll
+    def look_at(self, x, y, z):
+        x, y, z = x - self.x, y - self.y, z - self.z
+
+        # Roll is applied first in camera_matrix, so direction is rolled before solving
+        sin_z, cos_z = math.sin(self.z_rot), math.cos(self.z_rot)
+        angles = look_angles(cos_z * x + sin_z * y, cos_z * y - sin_z * x, z)
+        if angles is not None:
+            self.x_rot, self.y_rot = angles
+
+    # Rotates camera
+    def rotate_camera(self, x, y, z):
+        self.x_rot += x
+        self.z_rot += z
+
+        if -90 < self.y_rot < 90:
+            self.y_rot += y
+
+    # Sets target object for camera
+    def set_target(self, target):
+        self.target = target
+
+
+# ----------------------------------------
+# HUD CLASS: Static class to hold methods
+# for drawing HUD elements to screen
+# ----------------------------------------
+class HUD:
+
+    # Draws box to screen
+    def box(x, y, w, h):
+        mark_dirty(pyg.draw.rect(screen, (C_WHITE), (x, y, w, h), 2))
+
+    # Draws filled box to screen
+    def rect(x, y, w, h):
+        mark_dirty(pyg.draw.rect(screen, (C_WHITE), (x, y, w, h), 2))
+        pyg.draw.rect(screen, (C_BLACK), (x + 1, y + 1, w - 1, h - 1), 0)
+
+    # Draws text to screen
+    def text(x, y, string):
+        mark_dirty(glyph_cache.draw(screen, x, y, string))
+
+    # Draws whole numbers to screen at arrays of points, all in one batch
+    def numbers(xs, ys, values):
+        boxes = glyph_cache.draw_numbers(screen, xs, ys, values)
+        if screen_regions is not None:
+            screen_regions.add_boxes(*boxes)
+
+
+# Marks screen rect drawn over by the HUD, so it is presented now and cleared next frame
+def mark_dirty(rect):
+    if screen_regions is not None:
+        screen_regions.add_rect(rect)
+
+
+player = Player(0, 0, 0)
+
+
+# ------------------------------------------------------
+# Frame stages, called in order by render_frame. Kept
+# separate so they can be timed on their own (bench.py)
+# ------------------------------------------------------
+
+# Advances every model one physics step, then pushes apart overlapping solid models
+def step_physics():
+    global contacts
+    physics_world.step()
+    contacts = collide_bodies(physics_world)
+
+
+# -------------------------------------------------------------
+# Moves models that moved since the last sync to their new
+# scene_grid cells. Cells are found for all of them at once and
+# only models whose cell changed are touched
+# -------------------------------------------------------------
+def sync_grid():
+    rows = physics_world.take_moved()
+    if len(rows) == 0:
+        return
+
+    cells = np.floor(physics_world.position[rows] / scene_grid.cell_size).astype(np.int64)
+    changed = (cells != physics_world.cells[rows]).any(axis=1)
+    rows = rows[changed]
+    physics_world.cells[rows] = cells[changed]
+
+    bodies = physics_world.bodies
+    for row in rows.tolist():
+        mod = bodies[row]
+        if mod.grid_cell is not None:
+            scene_grid.update(mod)
+
+
+# Keeps scene_grid up to date, and streams scene cells around the player
+def sync_world():
+    sync_grid()
+    if scene_streamer is not None:
+        scene_streamer.update(player.x, player.y, player.z)
+
+
+# -------------------------------------------------------------
+# Sync step of run(): keeps the world in sync, then pushes the
+# player out of solid models. Runs between simulations, so the
+# model boxes aren't read while a step on the worker moves them
+# -------------------------------------------------------------
+def sync_frame():
+    sync_world()
+    player.collide()
+
+
+# Runs one physics step, keeping scene_grid up to date
+def update_physics():
+    step_physics()
+    sync_world()
+
+
+# Finds models near the view frustum through scene_grid, and
+# updates their distance to the player and the LOD level to draw
+def find_visible_models():
+    global visible_models
+    cam = player.cam
+
+    planes = frustum_planes_world(cam, SCREEN_WIDTH, SCREEN_HEIGHT)
+    visible_models = scene_grid.query_frustum(planes, cam.x, cam.y, cam.z, cam.render_distance)
+
+    for mod in visible_models:
+        x, y, z = mod.frame_matrix()[:, 3]
+        mod.distance = dist_to_point(player.x, player.y, player.z, x, y, z)
+
+        # Screen radius of bounding sphere, in pixels
+        size = mod.mesh.radius * abs(mod.scale) * cam.focal / max(mod.distance, 1e-6)
+        mod.lod_level = select_lod(mod.lod_level, size, len(mod.mesh.lods))
+
+
+# ------------------------------------------------------------
+# Returns (colors, points, depths) triangles of model, or None
+# if it is outside the view frustum. Faces are flat shaded by
+# scene_lights. Projected vertices are kept in model.screen_points
+# ------------------------------------------------------------
+def project_model(model):
+    model.screen_points = None
+    matrix = model_view_matrix(player.cam, model)
+    if not model_in_frustum(player.cam, model, SCREEN_WIDTH, SCREEN_HEIGHT, matrix):
+        return None
+
+    # Projected vertices are kept for the debug overlay, so it doesn't project the model again
+    view = view_points_batch(player.cam, model, matrix)
+    model.screen_points = project_view_points(view, SCREEN_WIDTH)
+
+    colors = None
+    if scene_lights:
+        colors = scene_lights.shade(model.mesh.lods[model.lod_level], model.frame_matrix())
+    return render_model_batch(player.cam, model, SCREEN_WIDTH, SCREEN_HEIGHT, False, matrix, view, colors)
+
+
+# -------------------------------------------------------------
+# Returns frame triangle list (colors, points, depths) of every
+# model and instance batch in view, as (T, 3), (T, 6) and (T, 3)
+# arrays. Models outside the view frustum are counted and
+# skipped. A model or batch is only projected again once the
+# camera, its transforms, its LOD level or the lights changed,
+# and if nothing changed last frame's list is returned as is,
+# so later stages can skip their work too
+# -------------------------------------------------------------
+def project_models():
+    global models_drawn, models_culled, instances_drawn, cache_hits, cache_misses, last_frame
+
+    cam_version = player.cam.version
+    lights_version = scene_lights.version
+    cache_hits, cache_misses = 0, 0
+
+    parts = []
+    for model in visible_models:
+        key = (cam_version, model.frame_version(), model.lod_level, lights_version)
+        cached = model.render_cache
+        if cached is not None and cached[0] == key:
+            cache_hits += 1
+        else:
+            cache_misses += 1
+            cached = model.render_cache = (key, project_model(model))
+
+        if cached[1] is not None:
+            parts.append(cached[1])
+
+    models_drawn = len(parts)
+
+    # Models skipped by scene_grid are culled too
+    models_culled = len(modelList) - models_drawn
+
+    instances_drawn = 0
+    for batch in batchList:
+        key = (cam_version, batch.version, lights_version)
+        cached = batch.render_cache
+        if cached is not None and cached[0] == key:
+            cache_hits += 1
+        else:
+            cache_misses += 1
+            cached = batch.render_cache = (key, batch.project(player.cam, SCREEN_WIDTH, SCREEN_HEIGHT, scene_lights))
+
+        instances_drawn += batch.drawn
+        if len(cached[1][0]):
+            parts.append(cached[1])
+
+    last_parts, frame = last_frame
+    if frame is not None and len(parts) == len(last_parts) and all(a is b for a, b in zip(parts, last_parts)):
+        return frame
+
+    if not parts:
+        frame = np.empty((0, 3), dtype=np.int64), np.empty((0, 6)), np.empty((0, 3))
+    else:
+        frame_colors, frame_points, frame_depths = zip(*parts)
+        colors = np.clip(np.concatenate(frame_colors), 0, 255)
+        frame = colors, np.concatenate(frame_points), np.concatenate(frame_depths)
+
+    last_frame = (parts, frame)
+    return frame
+
+
+# Returns painter's draw order of frame triangles, farthest first
+def sort_triangles(frame):
+    global last_sort
+    if last_sort[0] is frame:
+        return last_sort[1]
+
+    colors, points, depths = frame
+    order = painter_order(depths, SCREEN_WIDTH)
+    last_sort = (frame, order)
+    return order
+
+
+# -------------------------------------------------------------
+# Starts tracking a new frame in screen_regions with the tiles
+# under frame triangles. Returns list of rects to clear, tiles
+# drawn last frame or this one, or None when the whole screen
+# is to be cleared and flipped
+# -------------------------------------------------------------
+def dirty_rects(points):
+    global full_redraw
+    full_redraw = True
+    if screen_regions is None:
+        return None
+
+    screen_regions.next_frame()
+    screen_regions.add_triangles(points)
+    dirty = screen_regions.dirty()
+    if screen_regions.coverage(dirty) > DIRTY_FLIP_COVERAGE:
+        return None
+
+    full_redraw = False
+    return screen_regions.rects(dirty)
+
+
+# -------------------------------------------------------------
+# Clears screen and draws frame triangles in order, returns
+# polygon count. Only areas drawn last frame or this one are
+# cleared, see dirty_rects. Once the same frame is drawn twice
+# in a row a copy of the screen is kept, and blitted while it
+# repeats
+# -------------------------------------------------------------
+def raster_models(frame, order):
+    global last_raster
+    colors, points, depths = frame
+    repeated = last_raster[0] is frame
+    rects = dirty_rects(points)
+
+    if repeated and last_raster[1] is not None:
+        if rects is None:
+            screen.blit(last_raster[1], (0, 0))
+        else:
+            screen.blits([(last_raster[1], rect, rect) for rect in rects], False)
+        return len(order)
+
+    if RASTER_MODE == "zbuffer":
+        if not repeated:
+            raster_buffer.clear(screen_bgc, rects)
+            raster_buffer.draw(colors, points, depths, order)
+        raster_buffer.present(screen, rects)
+    else:
+        if rects is None:
+            screen.fill(screen_bgc)
+        else:
+            for rect in rects:
+                screen.fill(screen_bgc, rect)
+
+        for color, (x1, y1, x2, y2, x3, y3) in zip(colors[order].tolist(), points[order].tolist()):
+            pyg.draw.polygon(screen, color, ((x1, y1), (x2, y2), (x3, y3)), 0)
+
+    last_raster = (frame, screen.copy() if repeated else None)
+    return len(order)
+
+
+# Draws dot cross-hair and debug info
+def draw_hud():
+    mark_dirty(pyg.draw.circle(screen, (255, 255, 255), (HALF_SCREEN_W, HALF_SCREEN_H), 2))
+    debug()
+    if PROFILE_HUD:
+        draw_profile()
+
+
+# ------------------------------------------------------------
+# Presents finished frame. Only tiles drawn this frame or the
+# last are sent to the display, unless they cover most of it
+# ------------------------------------------------------------
+def present():
+    if full_redraw:
+        pyg.display.flip()
+        return
+
+    dirty = screen_regions.dirty()
+    if screen_regions.coverage(dirty) > DIRTY_FLIP_COVERAGE:
+        pyg.display.flip()
+    else:
+        pyg.display.update(screen_regions.rects(dirty))
+
+
+# Renders one frame of the current scene, returns polygon count
+def render_frame():
+    find_visible_models()
+    profiler.lap("cull")
+    frame = project_models()
+    profiler.lap("project")
+    order = sort_triangles(frame)
+    profiler.lap("sort")
+    poly_count = raster_models(frame, order)
+    profiler.lap("raster")
+    draw_hud()
+    profiler.lap("hud")
+    present()
+    profiler.lap("flip")
+    return poly_count
+
+
+# ---------------------------------------------------------
+#                     Main Game Loop
+# pipelined: simulates the next frame's physics on a worker
+# thread while the current frame is drawn
+# ---------------------------------------------------------
+def run(pipelined=True):
+    global frame_scheduler
+    frame_scheduler = FrameScheduler(physics_world, step_physics, sync_frame, pipelined=pipelined)
+
+    clock = pyg.time.Clock()
+    while True:
+
+        frame_time = clock.tick(60) / 1000
+        profiler.begin_frame()
+
+        for event in pyg.event.get():
+            event_handler(event)
+        profiler.lap("events")
+
+        player.key_update()
+        profiler.lap("player")
+
+        # Player collides in the scheduler's sync, once the simulation in flight is done
+        frame_scheduler.begin_frame(frame_time)
+        profiler.lap("physics")
+        player.update()
+        profiler.lap("player")
+        render_frame()
+        profiler.end_frame()
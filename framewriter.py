@@ -0,0 +1,125 @@
+# ------------------------------------------------------------
+# Module for writing rendered frames to disk. Frames are handed
+# over as raw RGB bytes and encoded on a pool of writer threads
+# (zlib releases the GIL while compressing), so encoding and
+# disk I/O overlap the rendering of the following frames
+#
+# "png": numbered PNG files in a folder, encoded in parallel
+# "raw": one file of back to back RGB24 frames, appended in
+#        order by a single writer, for ffmpeg -f rawvideo
+# ------------------------------------------------------------
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+FRAME_FORMATS = ("png", "raw")
+FRAME_NAME = "frame_%05d.png"  # PNG file name of each frame in the output folder
+PNG_LEVEL = 1  # zlib level, flat shaded frames compress well even at the fastest level
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+# Returns one PNG chunk, length, type, data and CRC
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+# ------------------------------------------------------------
+# Returns PNG file bytes of width x height RGB24 frame data.
+# Rows use the Sub filter, each byte minus the one a pixel to
+# the left, so flat colored faces become runs of zeros
+# ------------------------------------------------------------
+def encode_png(rgb, width, height, level=PNG_LEVEL):
+    pixels = np.frombuffer(rgb, dtype=np.uint8).reshape(height, width * 3)
+
+    rows = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 0] = 1  # Sub filter
+    rows[:, 1:4] = pixels[:, :3]
+    np.subtract(pixels[:, 3:], pixels[:, :-3], out=rows[:, 4:])
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8 bit RGB, no interlace
+    return (PNG_SIGNATURE + png_chunk(b"IHDR", header) +
+            png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)) + png_chunk(b"IEND", b""))
+
+
+# --------------------------------------------------------------
+# FRAME WRITER CLASS: Writes frames given to write() in the
+# background, blocking only once max_pending frames are queued,
+# which bounds memory when encoding falls behind rendering
+# path: output folder for "png", output file for "raw"
+# workers: encoding threads for "png", default one per CPU. Raw
+#  frames only need copying, one writer keeps them in order
+# --------------------------------------------------------------
+class FrameWriter:
+    def __init__(self, path, width, height, file_format="png", workers=None, level=PNG_LEVEL,
+                 max_pending=None):
+        if file_format not in FRAME_FORMATS:
+            raise ValueError("Unknown frame format: %s" % file_format)
+
+        self.path = path
+        self.width = width
+        self.height = height
+        self.file_format = file_format
+        self.level = level
+        self.frames = 0  # Frames given to write so far
+        self.bytes_written = 0
+
+        if file_format == "png":
+            os.makedirs(path, exist_ok=True)
+            self.out = None
+            self.workers = workers or os.cpu_count() or 1
+        else:
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self.out = open(path, "wb")
+            self.workers = 1
+
+        self.max_pending = max_pending or self.workers * 2 + 2
+        self.pending = deque()  # Futures of frames not yet known to be written, oldest first
+        self.executor = ThreadPoolExecutor(self.workers)
+
+    # Queues RGB24 bytes of the next frame, returns its index
+    def write(self, rgb):
+        while len(self.pending) >= self.max_pending:
+            self.bytes_written += self.pending.popleft().result()  # Re-raises errors of the writer
+
+        index = self.frames
+        if self.file_format == "png":
+            self.pending.append(self.executor.submit(self.write_png, index, rgb))
+        else:
+            self.pending.append(self.executor.submit(self.write_raw, rgb))
+        self.frames += 1
+        return index
+
+    # Encodes and saves frame index, runs on a writer thread
+    def write_png(self, index, rgb):
+        data = encode_png(rgb, self.width, self.height, self.level)
+        with open(os.path.join(self.path, FRAME_NAME % index), "wb") as out:
+            out.write(data)
+        return len(data)
+
+    # Appends frame to the raw file, runs on the single writer thread
+    def write_raw(self, rgb):
+        self.out.write(rgb)
+        return len(rgb)
+
+    # Waits until every frame is written, and closes the output
+    def close(self):
+        while self.pending:
+            self.bytes_written += self.pending.popleft().result()
+        self.executor.shutdown()
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    # Returns ffmpeg command line encoding the output to video_name at fps
+    def ffmpeg_command(self, fps, video_name="out.mp4"):
+        if self.file_format == "png":
+            source = "-framerate %g -i %s" % (fps, os.path.join(self.path, FRAME_NAME))
+        else:
+            source = "-f rawvideo -pix_fmt rgb24 -s %dx%d -r %g -i %s" % (self.width, self.height, fps, self.path)
+        return "ffmpeg %s -pix_fmt yuv420p %s" % (source, video_name)
@@ -0,0 +1,461 @@
+# ------------------------------------------------------------
+# Module for batched projection functions, works on whole
+# NumPy arrays of vertex and face data instead of single points
+# ------------------------------------------------------------
+import math
+
+import numpy as np
+
+NEAR_CLIP = 0.1  # Camera space z of the near plane triangles are clipped to
+
+
+# ---------------------------------------------------------
+# Returns cross product of every face in passed point arrays
+# ---------------------------------------------------------
+def cross_product_batch(x1, y1, x2, y2, x3, y3):
+    return (x2 * y3 - x3 * y2) - (x1 * y3 - x3 * y1) + (x1 * y2 - x2 * y1)
+
+
+# -------------------------------------------------------------
+# Returns 3x3 matrix of the three camera rotations, in the same
+# order as project_points: z_rot, then x_rot, then y_rot
+# -------------------------------------------------------------
+def camera_matrix(camera):
+    sin_z, cos_z = math.sin(camera.z_rot), math.cos(camera.z_rot)
+    sin_x, cos_x = math.sin(camera.x_rot), math.cos(camera.x_rot)
+    sin_y, cos_y = math.sin(camera.y_rot), math.cos(camera.y_rot)
+
+    rot_z = np.array([[cos_z, sin_z, 0], [-sin_z, cos_z, 0], [0, 0, 1]])
+    rot_x = np.array([[cos_x, 0, sin_x], [0, 1, 0], [-sin_x, 0, cos_x]])
+    rot_y = np.array([[1, 0, 0], [0, cos_y, sin_y], [0, -sin_y, cos_y]])
+    return rot_y @ rot_x @ rot_z
+
+
+# ------------------------------------------------------------
+# Returns (N, 3, 4) model-to-world matrices of (N, 7) transform
+# rows (x, y, z, x_rot, y_rot, z_rot, scale), same layout and
+# rotation as funcmodel.model_matrix, built for all at once
+# ------------------------------------------------------------
+def transform_matrices(state):
+    matrices = np.empty((len(state), 3, 4))
+    matrices[:, :, :3] = rotation_matrices(state[:, 3:6]) * state[:, 6, None, None]
+    matrices[:, :, 3] = state[:, 0:3]
+    return matrices
+
+
+# ------------------------------------------------------------
+# Returns (N, 3, 3) rotation matrices of (N, 3) angle rows
+# (x_rot, y_rot, z_rot), funcmodel.rotation_matrix of each
+# ------------------------------------------------------------
+def rotation_matrices(angles):
+    xrot, yrot, zrot = angles.T
+    cosA, sinA = np.cos(zrot), np.sin(zrot)
+    cosB, sinB = np.cos(xrot), np.sin(xrot)
+    cosC, sinC = np.cos(yrot), np.sin(yrot)
+
+    matrices = np.empty((len(angles), 3, 3))
+    matrices[:, 0, 0] = cosA * cosB
+    matrices[:, 0, 1] = cosA * sinB * sinC - sinA * cosC
+    matrices[:, 0, 2] = cosA * sinB * cosC + sinA * sinC
+    matrices[:, 1, 0] = sinA * cosB
+    matrices[:, 1, 1] = sinA * sinB * sinC + cosA * cosC
+    matrices[:, 1, 2] = sinA * sinB * cosC - cosA * sinC
+    matrices[:, 2, 0] = -sinB
+    matrices[:, 2, 1] = cosB * sinC
+    matrices[:, 2, 2] = cosB * cosC
+    return matrices
+
+
+# --------------------------------------------------------------
+# Returns (N, 3) angle rows of (N, 3, 3) rotation matrices, the
+# inverse of rotation_matrices, see funcmodel.rotation_angles
+# --------------------------------------------------------------
+def rotation_angles_batch(matrices):
+    cosB = np.hypot(matrices[:, 0, 0], matrices[:, 1, 0])
+    locked = cosB < 1e-9
+    angles = np.column_stack((np.arctan2(-matrices[:, 2, 0], cosB),
+                              np.arctan2(matrices[:, 2, 1], matrices[:, 2, 2]),
+                              np.arctan2(matrices[:, 1, 0], matrices[:, 0, 0])))
+    angles[locked, 1] = 0
+    angles[locked, 2] = np.arctan2(-matrices[locked, 0, 1], matrices[locked, 1, 1])
+    return angles
+
+
+# --------------------------------------------------------------
+# Returns (N, 4) unit quaternions (w, x, y, z) of (N, 3, 3)
+# rotation matrices. Each is solved from whichever of w, x, y, z
+# is largest, which keeps the division well away from 0
+# --------------------------------------------------------------
+def rotation_quaternions(matrices):
+    m00, m11, m22 = matrices[:, 0, 0], matrices[:, 1, 1], matrices[:, 2, 2]
+    squares = np.column_stack((1 + m00 + m11 + m22, 1 + m00 - m11 - m22,
+                               1 - m00 + m11 - m22, 1 - m00 - m11 + m22))  # 4 * (w, x, y, z) squared
+    largest = np.argmax(squares, axis=1)
+    rows = np.arange(len(matrices))
+    square = squares[rows, largest]
+    big = np.sqrt(square) * 2  # 4 * the largest component, never below 2
+
+    # Pair sums and differences of the off diagonal give 4 * product of two components
+    wx = matrices[:, 2, 1] - matrices[:, 1, 2]
+    wy = matrices[:, 0, 2] - matrices[:, 2, 0]
+    wz = matrices[:, 1, 0] - matrices[:, 0, 1]
+    xy = matrices[:, 0, 1] + matrices[:, 1, 0]
+    xz = matrices[:, 0, 2] + matrices[:, 2, 0]
+    yz = matrices[:, 1, 2] + matrices[:, 2, 1]
+    products = np.stack((np.column_stack((square, wx, wy, wz)),
+                         np.column_stack((wx, square, xy, xz)),
+                         np.column_stack((wy, xy, square, yz)),
+                         np.column_stack((wz, xz, yz, square))), axis=1)
+    return products[rows, largest] / big[:, None]
+
+
+# ----------------------------------------------------------
+# Returns (N, 3, 3) rotation matrices of (N, 4) unit
+# quaternions (w, x, y, z), the inverse of rotation_quaternions
+# ----------------------------------------------------------
+def quaternion_matrices(quaternions):
+    w, x, y, z = quaternions.T
+    matrices = np.empty((len(quaternions), 3, 3))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - w * z)
+    matrices[:, 0, 2] = 2 * (x * z + w * y)
+    matrices[:, 1, 0] = 2 * (x * y + w * z)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - w * x)
+    matrices[:, 2, 0] = 2 * (x * z - w * y)
+    matrices[:, 2, 1] = 2 * (y * z + w * x)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+
+# -------------------------------------------------------------
+# Returns (N, 4) quaternions turned alpha of the way from q1 to
+# q2 along the shorter arc, at a constant rate (slerp). Nearly
+# equal pairs are blended linearly and normalized instead
+# -------------------------------------------------------------
+def slerp_quaternions(q1, q2, alpha):
+    dot = (q1 * q2).sum(axis=1)
+    q2 = np.where(dot[:, None] < 0, -q2, q2)  # q and -q are the same turn, takes the nearer
+    angle = np.arccos(np.clip(np.abs(dot), 0, 1))
+    sin_angle = np.sin(angle)
+
+    near = sin_angle < 1e-6
+    safe = np.where(near, 1, sin_angle)
+    w1 = np.where(near, 1 - alpha, np.sin((1 - alpha) * angle) / safe)
+    w2 = np.where(near, alpha, np.sin(alpha * angle) / safe)
+    blended = q1 * w1[:, None] + q2 * w2[:, None]
+    return blended / np.linalg.norm(blended, axis=1)[:, None]
+
+
+# -----------------------------------------------------------
+# Returns 3x4 view matrix of camera, taking world points to
+# camera space: camera_matrix @ (point - camera position)
+# -----------------------------------------------------------
+def view_matrix(camera):
+    cam_matrix = camera_matrix(camera)
+
+    matrix = np.empty((3, 4))
+    matrix[:, :3] = cam_matrix
+    matrix[:, 3] = -(cam_matrix @ (camera.x, camera.y, camera.z))
+    return matrix
+
+
+# ----------------------------------------------------------
+# Returns 3x4 matrix taking model rest-pose vertices straight
+# to camera space, model matrix composed with the view matrix
+# cached by the camera
+# ----------------------------------------------------------
+def model_view_matrix(camera, model):
+    view = camera.view_matrix
+    model_mat = model.frame_matrix()
+
+    matrix = np.empty((3, 4))
+    matrix[:, :3] = view[:, :3] @ model_mat[:, :3]
+    matrix[:, 3] = view[:, :3] @ model_mat[:, 3] + view[:, 3]
+    return matrix
+
+
+# ----------------------------------------------------
+# Returns (N, 3) camera space vertices of model, taken
+# from rest pose by one combined transform per vertex
+# ----------------------------------------------------
+def view_points_batch(camera, model, matrix=None):
+    if matrix is None:
+        matrix = model_view_matrix(camera, model)
+    return model.rest_vertices @ matrix[:, :3].T + matrix[:, 3]
+
+
+# ----------------------------------------------------
+# Returns (..., 3) 2D points and their depth of camera
+# space points view. Points on the camera plane are
+# left as inf / nan, triangles are clipped before this
+# ----------------------------------------------------
+def project_view_points(view, screen_w):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        translated_z = (screen_w / 2) / view[..., 2]
+        return np.stack((translated_z * view[..., 0], translated_z * view[..., 1], translated_z), axis=-1)
+
+
+# ----------------------------------------------------
+# Projects 3D Vertex data in model to 2D plane
+# Returns (N, 3) array of 2D points and their depth,
+# matching funcmath.project_points row for row
+# up to floating point rounding
+# ----------------------------------------------------
+def project_points_batch(camera, model, screen_w, matrix=None):
+    return project_view_points(view_points_batch(camera, model, matrix), screen_w)
+
+
+# --------------------------------------------------------------
+# Returns (5, 3) unit normals of the view frustum planes in camera
+# space: left, right, top, bottom, near. Points in view have a
+# positive distance to every plane. Projection divides by z and
+# scales by half the screen width, so the sides are at x = +-z
+# and y = +-z * scrn_h / scrn_w
+# --------------------------------------------------------------
+def frustum_planes(scrn_w, scrn_h):
+    slope_y = scrn_h / scrn_w
+    planes = np.array([[1, 0, 1], [-1, 0, 1],
+                       [0, 1, slope_y], [0, -1, slope_y],
+                       [0, 0, 1]], dtype=np.float64)
+    return planes / np.linalg.norm(planes, axis=1)[:, None]
+
+
+# -------------------------------------------------------------
+# Returns (5, 4) frustum planes in world space as (a, b, c, d),
+# a * x + b * y + c * z + d >= 0 for points in view
+# -------------------------------------------------------------
+def frustum_planes_world(camera, scrn_w, scrn_h):
+    view = camera.view_matrix
+
+    # Camera space is view @ (p, 1), so plane . (view @ (p, 1)) is a plane in world space
+    planes = frustum_planes(scrn_w, scrn_h)
+    return np.column_stack((planes @ view[:, :3], planes @ view[:, 3]))
+
+
+# ------------------------------------------------------------
+# Returns True if model may be visible. Tests the bounding
+# sphere of its mesh against the view frustum first, then the
+# 8 corners of its box, which must not all be outside one plane
+# matrix: model_view_matrix of model, computed if not passed
+# ------------------------------------------------------------
+def model_in_frustum(camera, model, scrn_w, scrn_h, matrix=None):
+    if model.distance >= camera.render_distance:
+        return False
+
+    if matrix is None:
+        matrix = model_view_matrix(camera, model)
+    planes = frustum_planes(scrn_w, scrn_h)
+    mesh = model.mesh
+
+    # Bounding sphere, rotation keeps lengths so radius only scales
+    center = matrix[:, :3] @ mesh.center + matrix[:, 3]
+    radius = mesh.radius * abs(model.scale)
+    distances = planes @ center
+    if (distances < -radius).any():
+        return False
+    if (distances > radius).all():
+        return True
+
+    # Sphere crosses a plane, box gives a tighter answer
+    lo, hi = mesh.aabb_min, mesh.aabb_max
+    corners = np.array([[lo[0], lo[1], lo[2]], [hi[0], lo[1], lo[2]],
+                        [lo[0], hi[1], lo[2]], [hi[0], hi[1], lo[2]],
+                        [lo[0], lo[1], hi[2]], [hi[0], lo[1], hi[2]],
+                        [lo[0], hi[1], hi[2]], [hi[0], hi[1], hi[2]]])
+    corners = corners @ matrix[:, :3].T + matrix[:, 3]
+    outside = (corners @ planes.T) < 0
+    return not outside.all(axis=0).any()
+
+
+# ------------------------------------------------------
+# camera: Passed Camera Object
+# model: Passed Model Object to be rendered
+# scrn_w: Screen Width
+# scrn_h: Screen Height
+# matrix: model_view_matrix of model, computed if not passed
+# view: view_points_batch of model, computed if not passed
+# colors: (M, 3) face colors to draw, lit by lighting.py, file
+#  colors if not passed
+# IF ret_cross:
+#  returns array of cross products of each face in view
+# ELSE:
+#  returns (M, 3) array of face colors, (M, 6) array of
+#  2D screen points (x1, y1, x2, y2, x3, y3) to draw and
+#  (M, 3) array of the depth (half_screen_w / z) of each
+# ------------------------------------------------------
+def render_model_batch(camera, model, scrn_w, scrn_h, ret_cross, matrix=None, view=None, colors=None):
+    if model.distance >= camera.render_distance:
+        if ret_cross:
+            return np.empty(0)
+        return np.empty((0, 3), dtype=model.faces.dtype), np.empty((0, 6)), np.empty((0, 3))
+
+    if view is None:
+        view = view_points_batch(camera, model, matrix)
+
+    faces = model.faces
+    v1 = view[faces[:, 0]]
+    v2 = view[faces[:, 1]]
+    v3 = view[faces[:, 2]]
+    if colors is None:
+        colors = faces[:, 3:6]
+    return screen_triangles(colors, v1, v2, v3, scrn_w, scrn_h, ret_cross)
+
+
+# -------------------------------------------------------------
+# Returns triangles (colors, v1, v2, v3) clipped to the side of
+# a camera space plane where v . normal + offset >= 0. Corners
+# are (T, 3) arrays. Triangles crossing the plane are cut along
+# it: one corner inside leaves one smaller triangle, two leave
+# a quad split into two. Winding is kept, so culling still holds
+# -------------------------------------------------------------
+def clip_triangles(colors, v1, v2, v3, normal, offset=0.0):
+    corners = np.stack((v1, v2, v3), axis=1)
+    distances = corners @ normal + offset
+    inside = distances >= 0
+    count = inside.sum(axis=1)
+
+    if (count == 3).all():
+        return colors, v1, v2, v3
+
+    parts = [(colors[count == 3], v1[count == 3], v2[count == 3], v3[count == 3])]
+    rows = np.arange(3)
+
+    for kept in (1, 2):
+        tris = np.flatnonzero(count == kept)
+        if len(tris) == 0:
+            continue
+
+        # Turns corners so the odd one out (inside for 1, outside for 2) is first, keeping winding
+        first = np.argmax(inside[tris] if kept == 1 else ~inside[tris], axis=1)
+        order = (first[:, None] + rows) % 3
+        a, b, c = np.moveaxis(np.take_along_axis(corners[tris], order[:, :, None], axis=1), 1, 0)
+        da, db, dc = np.take_along_axis(distances[tris], order, axis=1).T
+
+        # Points where edges a-b and a-c cross the plane
+        ab = a + (b - a) * (da / (da - db))[:, None]
+        ac = a + (c - a) * (da / (da - dc))[:, None]
+
+        tri_colors = colors[tris]
+        if kept == 1:
+            parts.append((tri_colors, a, ab, ac))
+        else:
+            parts.append((tri_colors, ab, b, c))
+            parts.append((tri_colors, ab, c, ac))
+
+    colors, v1, v2, v3 = zip(*parts)
+    return np.concatenate(colors), np.concatenate(v1), np.concatenate(v2), np.concatenate(v3)
+
+
+# -------------------------------------------------------------
+# Returns (colors, points, depths) of front facing triangles in
+# view, from (T, 3) camera space corners v1, v2, v3 of triangles
+# and their (T, 3) colors. Back faces are dropped first, then
+# triangles are clipped to the near plane and the screen edges,
+# so a triangle reaching behind the camera or off screen draws
+# the part in view instead of vanishing. ret_cross: return cross
+# products of every clipped triangle instead
+# -------------------------------------------------------------
+def screen_triangles(colors, v1, v2, v3, scrn_w, scrn_h, ret_cross=False):
+    half_screen_w = scrn_w / 2
+    half_screen_h = scrn_h / 2
+
+    # Sign of the triple product is the sign of the screen cross product wherever the triangle is in view
+    if not ret_cross:
+        front = (v1 * np.cross(v2, v3)).sum(axis=1) > 0
+        colors, v1, v2, v3 = colors[front], v1[front], v2[front], v3[front]
+
+    # Distance of every corner to every plane, triangles wholly inside are kept as they are, and
+    # triangles with all corners outside one plane dropped, so only those crossing one are clipped
+    planes = frustum_planes(scrn_w, scrn_h)
+    offsets = np.array([[0], [0], [0], [0], [-NEAR_CLIP]])
+    d1, d2, d3 = planes @ v1.T + offsets, planes @ v2.T + offsets, planes @ v3.T + offsets
+    kept = np.minimum(np.minimum(d1, d2), d3).min(axis=0) >= 0
+    cut = ~kept & (np.maximum(np.maximum(d1, d2), d3).min(axis=0) >= 0)
+
+    if cut.any():
+        cut_colors, c1, c2, c3 = colors[cut], v1[cut], v2[cut], v3[cut]
+
+        # Near plane first, so every corner left has z > 0
+        cut_colors, c1, c2, c3 = clip_triangles(cut_colors, c1, c2, c3, planes[4], -NEAR_CLIP)
+        for normal in planes[:4]:
+            cut_colors, c1, c2, c3 = clip_triangles(cut_colors, c1, c2, c3, normal)
+
+        colors = np.concatenate((colors[kept], cut_colors))
+        v1 = np.concatenate((v1[kept], c1))
+        v2 = np.concatenate((v2[kept], c2))
+        v3 = np.concatenate((v3[kept], c3))
+    elif not kept.all():
+        colors, v1, v2, v3 = colors[kept], v1[kept], v2[kept], v3[kept]
+
+    p1 = project_view_points(v1, scrn_w)
+    p2 = project_view_points(v2, scrn_w)
+    p3 = project_view_points(v3, scrn_w)
+
+    # Transforms 2D points to screen bounds
+    x1 = p1[:, 0] + half_screen_w
+    y1 = p1[:, 1] + half_screen_h
+    x2 = p2[:, 0] + half_screen_w
+    y2 = p2[:, 1] + half_screen_h
+    x3 = p3[:, 0] + half_screen_w
+    y3 = p3[:, 1] + half_screen_h
+
+    # Finds surface normal cross product of every polygon
+    cross_prod = cross_product_batch(x1, y1, x2, y2, x3, y3)
+
+    if ret_cross:
+        return cross_prod
+
+    # Drops slivers clipping left with no area
+    front = cross_prod > 0
+    points = np.column_stack((x1, y1, x2, y2, x3, y3))[front]
+    depths = np.column_stack((p1[:, 2], p2[:, 2], p3[:, 2]))[front]
+    return colors[front], points, depths
+
+
+# -------------------------------------------------------------
+# Returns (colors, points, depths) triangles of every copy of
+# mesh placed by (K, 3, 4) model matrices, like render_model_batch
+# for K models at once. Vertices of all copies are taken to
+# camera space by one broadcast matrix product. colors: (K, M, 3)
+# face colors of each copy, file colors if not passed
+# -------------------------------------------------------------
+def render_instances_batch(camera, mesh, matrices, scrn_w, scrn_h, colors=None):
+    view = camera.view_matrix
+
+    # Model-view matrices of every copy
+    rotations = view[:, :3] @ matrices[:, :, :3]
+    offsets = matrices[:, :, 3] @ view[:, :3].T + view[:, 3]
+
+    view_points = mesh.vertices.astype(np.float64) @ rotations.transpose(0, 2, 1) + offsets[:, None, :]
+
+    faces = mesh.faces
+    v1 = view_points[:, faces[:, 0]].reshape(-1, 3)
+    v2 = view_points[:, faces[:, 1]].reshape(-1, 3)
+    v3 = view_points[:, faces[:, 2]].reshape(-1, 3)
+    if colors is None:
+        colors = np.broadcast_to(faces[:, 3:6], (len(matrices),) + faces[:, 3:6].shape)
+    colors = colors.reshape(-1, 3)
+    return screen_triangles(colors, v1, v2, v3, scrn_w, scrn_h)
+
+
+# -------------------------------------------------------------
+# Returns draw order for painter's algorithm, farthest triangle
+# first. depths: (T, 3) vertex depths from render_model_batch.
+# Triangle distance is quantized to 16 bit keys, which NumPy's
+# stable sort orders with a radix sort instead of a comparison
+# sort. Triangles with equal keys keep their submitted order
+# -------------------------------------------------------------
+def painter_order(depths, scrn_w):
+    if len(depths) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Mean camera space z of each triangle
+    distance = (scrn_w / 2) * (1 / depths).mean(axis=1)
+
+    near, far = distance.min(), distance.max()
+    if far > near:
+        keys = ((far - distance) * (65535 / (far - near))).astype(np.uint16)
+    else:
+        keys = np.zeros(len(distance), dtype=np.uint16)
+    return np.argsort(keys, kind="stable")
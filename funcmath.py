@@ -44,6 +44,18 @@ def point_at(x1, y1, z1, x2, y2, z2):
     return x2 - x1, y2 - y1, z2 - z1
 
 
+# ------------------------------------------------------------
+# Returns camera (x_rot, y_rot) facing along direction vector,
+# camera forward is (-sin x_rot * cos y_rot, -sin y_rot,
+# cos x_rot * cos y_rot) with no z_rot, as in key movement
+# ------------------------------------------------------------
+def look_angles(x, y, z):
+    length = math.sqrt(x * x + y * y + z * z)
+    if length == 0:
+        return None
+    return math.atan2(-x, z), math.asin(clamp(-y / length, -1, 1))
+
+
 # ----------------------------------
 # Returns 3D center point of a face
 # ----------------------------------
@@ -134,15 +146,23 @@ def project_points(camera, model, screen_w):
 
     translated_points = []  # Holds 2D point data for each vertex in model
 
+    # Rows of camera view matrix, built once per camera update
+    (xx, xy, xz, xw), (yx, yy, yz, yw), (zx, zy, zz, zw) = camera.view_matrix.tolist()
+
     # Projects 3D points to 2D surface
     for x, y, z in model.vertices:
-        x -= camera.x - model.x
-        y -= camera.y - model.y
-        z -= camera.z - model.z
-
-        x, y = camera_rotate(x, y, camera.z_rot)
-        x, z = camera_rotate(x, z, camera.x_rot)
-        y, z = camera_rotate(y, z, camera.y_rot)
+        x += model.x
+        y += model.y
+        z += model.z
+
+        x, y, z = (xx * x + xy * y + xz * z + xw,
+                   yx * x + yy * y + yz * z + yw,
+                   zx * x + zy * y + zz * z + zw)
+
+        # Points on the camera plane can't be projected, depth 0 fails the view-cone test
+        if z == 0:
+            translated_points.append((0.0, 0.0, 0.0))
+            continue
 
         translated_z = half_screen_w / z
         x, y = translated_z * x, translated_z * y
@@ -3,6 +3,8 @@
 # --------------------------------------------------
 import math
 
+import numpy as np
+
 # -----------------------------------------------------
 # Transforms passed object's position in 3D space
 # -----------------------------------------------------
@@ -23,28 +25,27 @@ def translate(object, x, y, z):
 # Returns x, y, z position of passed object
 # ------------------------------------------
 def get_coords(object):
-    object = model.x
-    object = model.y
-    object = model.z
-    return x, y, z
+    return object.x, object.y, object.z
 
-# ------------------------------------
-# Scales given model
-# ------------------------------------
+# ----------------------------------------------------
+# Scales given model, model matrix is rebuilt on next use
+# ----------------------------------------------------
 def scale(model, scale):
-    for a in range(len(model.vertices)):
-        model.vertices[a][0] *= scale
-        model.vertices[a][1] *= scale
-        model.vertices[a][2] *= scale
+    model.scale *= scale
 
-# --------------------------------------------
-# Rotates given model using rotation matrices
-# --------------------------------------------
+# ----------------------------------------------------------
+# Rotates given model by passed angles, turning it from its
+# current orientation like rotating its vertices would. Rest-pose
+# vertices are left untouched and the model matrix is rebuilt
+# ----------------------------------------------------------
 def rotate(model, xrot, yrot, zrot):
-    model.x_rot = xrot
-    model.y_rot = yrot
-    model.z_rot = zrot
+    matrix = rotation_matrix(xrot, yrot, zrot) @ rotation_matrix(model.x_rot, model.y_rot, model.z_rot)
+    model.x_rot, model.y_rot, model.z_rot = rotation_angles(matrix)
 
+# ---------------------------------------
+# Returns 3x3 rotation matrix for angles
+# ---------------------------------------
+def rotation_matrix(xrot, yrot, zrot):
     cosA = math.cos(zrot)
     sinA = math.sin(zrot)
     cosB = math.cos(xrot)
@@ -64,11 +65,28 @@ def rotate(model, xrot, yrot, zrot):
     matZY = cosB * sinC
     matZZ = cosB * cosC
 
-    for a in range(len(model.vertices)):
-        x = model.vertices[a][0]
-        y = model.vertices[a][1]
-        z = model.vertices[a][2]
+    return np.array([[matXX, matXY, matXZ],
+                     [matYX, matYY, matYZ],
+                     [matZX, matZY, matZZ]])
+
+# -------------------------------------------------------------
+# Returns xrot, yrot, zrot angles of 3x3 rotation matrix, the
+# inverse of rotation_matrix. xrot is kept within +-pi / 2, at
+# exactly +-pi / 2 yrot is 0 and zrot holds the whole turn
+# -------------------------------------------------------------
+def rotation_angles(matrix):
+    cosB = math.hypot(matrix[0, 0], matrix[1, 0])
+    xrot = math.atan2(-matrix[2, 0], cosB)
+    if cosB < 1e-9:
+        return xrot, 0.0, math.atan2(-matrix[0, 1], matrix[1, 1])
+    return xrot, math.atan2(matrix[2, 1], matrix[2, 2]), math.atan2(matrix[1, 0], matrix[0, 0])
 
-        model.vertices[a][0] = matXX * x + matXY * y + matXZ * z
-        model.vertices[a][1] = matYX * x + matYY * y + matYZ * z
-        model.vertices[a][2] = matZX * x + matZY * y + matZZ * z
\ No newline at end of file
+# -------------------------------------------------------------
+# Returns 3x4 model-to-world matrix of passed model:
+# rotation and scale in the first 3 columns, position in last
+# -------------------------------------------------------------
+def model_matrix(model):
+    matrix = np.empty((3, 4))
+    matrix[:, :3] = rotation_matrix(model.x_rot, model.y_rot, model.z_rot) * model.scale
+    matrix[:, 3] = (model.x, model.y, model.z)
+    return matrix
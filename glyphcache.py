@@ -0,0 +1,111 @@
+# ------------------------------------------------------------
+# Module for cached HUD text. Rendered strings are kept in a
+# least recently used cache, and numbers are composed from
+# glyphs of their characters rendered once, so labels changing
+# every frame (timings, vertex IDs) cost a blit per character
+# instead of a font.render each
+# ------------------------------------------------------------
+from collections import OrderedDict
+
+import numpy as np
+import pygame as pyg
+
+GLYPH_CACHE_SIZE = 256  # Most rendered strings kept
+NUMBER_CHARS = "0123456789.-"  # Strings of only these are drawn glyph by glyph
+
+
+# -------------------------------------------------------------
+# GLYPH CACHE CLASS: Draws text of font in color. Keeps the
+# max_strings most recently drawn strings rendered, and one
+# glyph of each of NUMBER_CHARS for numbers. Glyphs are spaced
+# by how far font.size moves on for each pair of characters,
+# so kerned numbers land within a pixel of font.render
+# -------------------------------------------------------------
+class GlyphCache:
+    def __init__(self, font, color, max_strings=GLYPH_CACHE_SIZE):
+        self.font = font
+        self.color = color
+        self.max_strings = max_strings
+        self.height = font.get_height()
+
+        self.strings = OrderedDict()  # Most recently drawn string surfaces, oldest first
+        self.hits = 0
+        self.misses = 0
+
+        self.glyphs = {char: font.render(char, 0, color) for char in NUMBER_CHARS}
+        self.widths = {char: font.size(char)[0] for char in NUMBER_CHARS}
+        self.advances = {(first, second): font.size(first + second)[0] - self.widths[second]
+                         for first in NUMBER_CHARS for second in NUMBER_CHARS}  # Step from first to second
+
+        # Numbers are drawn two digits a glyph, "00" to "99", then single digits for odd leading ones
+        digits = [str(digit) for digit in range(10)]
+        self.pair_glyphs = [font.render(first + second, 0, color) for first in digits for second in digits]
+        self.pair_glyphs += [self.glyphs[digit] for digit in digits]
+        self.digit_widths = np.array([self.widths[digit] for digit in digits])
+        self.digit_advances = np.array([[self.advances[first, second] for second in digits] for first in digits])
+
+    # Returns rendered surface of string, from the cache if drawn recently
+    def render(self, string):
+        surface = self.strings.get(string)
+        if surface is None:
+            self.misses += 1
+            surface = self.font.render(string, 0, self.color)
+            self.strings[string] = surface
+            if len(self.strings) > self.max_strings:
+                self.strings.popitem(last=False)
+        else:
+            self.hits += 1
+            self.strings.move_to_end(string)
+        return surface
+
+    # Draws string to surface at (x, y), returns Rect drawn over
+    def draw(self, surface, x, y, string):
+        if not string or not all(char in self.glyphs for char in string):
+            return surface.blit(self.render(string), (x, y))
+
+        start = x
+        blits = []
+        for char, next_char in zip(string, string[1:]):
+            blits.append((self.glyphs[char], (x, y)))
+            x += self.advances[char, next_char]
+        blits.append((self.glyphs[string[-1]], (x, y)))
+        surface.blits(blits, False)
+        return pyg.Rect(start, y, x + self.widths[string[-1]] - start, self.height)
+
+    # -------------------------------------------------------------
+    # Draws whole numbers >= 0 with their left top corners at
+    # (xs, ys), all in one Surface.blits. Digits and offsets of
+    # every number are worked out as arrays, and drawn two digits
+    # a blit. Returns (x1, y1, x2, y2) arrays of the boxes drawn
+    # over
+    # -------------------------------------------------------------
+    def draw_numbers(self, surface, xs, ys, numbers):
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        numbers = np.asarray(numbers, dtype=np.int64)
+        if len(numbers) == 0:
+            return xs, ys, xs, ys
+
+        # Digit count of each number, digits right aligned in a (N, max digits) grid of even width
+        powers = 10 ** np.arange(19, dtype=np.int64)
+        lengths = np.searchsorted(powers[1:], numbers, side="right") + 1
+        columns = int(lengths.max() + 1) // 2 * 2
+        digits = numbers[:, None] // powers[columns - 1::-1] % 10
+        used = np.arange(columns) >= columns - lengths[:, None]
+
+        # Step from each digit to the next, the last digit steps its whole width
+        steps = np.concatenate((self.digit_advances[digits[:, :-1], digits[:, 1:]],
+                                self.digit_widths[digits[:, -1:]]), axis=1)
+        advances = np.where(used, steps, 0)
+        offsets = np.cumsum(advances, axis=1) - advances
+
+        # Glyph of each digit pair, a single digit where the first of the pair is unused
+        first, second = digits[:, 0::2], digits[:, 1::2]
+        pairs = np.where(used[:, 0::2], first * 10 + second, 100 + second)
+        drawn = used[:, 1::2]
+        x = (xs[:, None] + offsets[:, 0::2])[drawn]  # Unused digits step 0, so the offset holds either way
+        y = np.broadcast_to(ys[:, None], drawn.shape)[drawn]
+
+        glyphs = self.pair_glyphs
+        surface.blits(list(zip(map(glyphs.__getitem__, pairs[drawn].tolist()), zip(x.tolist(), y.tolist()))), False)
+        return xs, ys, xs + advances.sum(axis=1), ys + self.height
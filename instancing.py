@@ -0,0 +1,98 @@
+# ------------------------------------------------------------
+# Module for instanced drawing. An instance batch draws many
+# copies of one mesh from an array of transforms, culled,
+# level-of-detail picked and projected as whole arrays, so each
+# copy costs a row of floats instead of a Python object
+# ------------------------------------------------------------
+import numpy as np
+from funcbatch import *
+from lod import *
+
+INSTANCE_CHUNK_VERTICES = 1 << 20  # Most vertices projected in one broadcast, bounds temporary arrays
+
+
+# --------------------------------------------------------------
+# INSTANCE BATCH CLASS: Copies of one shared Mesh, one row of
+# (x, y, z, x_rot, y_rot, z_rot, scale) per copy. After editing
+# transforms in place call moved(), so cached matrices and
+# projections are rebuilt
+# --------------------------------------------------------------
+class InstanceBatch:
+    def __init__(self, mesh, transforms):
+        self.mesh = mesh  # Shared geometry of every copy, see mesh.py
+        self.version = 0  # Bumped whenever transforms change
+
+        self._matrices = None  # Cached (N, 3, 4) model-to-world matrices
+        self._matrix_version = -1  # Version _matrices were built from
+
+        self.render_cache = None  # (key, projected triangles) of last projection, see project_models
+        self.drawn = 0  # Copies that passed frustum culling at the last projection
+        self.set_transforms(transforms)
+
+    # Replaces transforms with (N, 7) array
+    def set_transforms(self, transforms):
+        self.transforms = np.array(transforms, dtype=np.float64).reshape(-1, 7)
+        self.lod_levels = np.zeros(len(self.transforms), dtype=np.intp)  # Level each copy drew last
+        self.moved()
+
+    # Marks transforms as changed
+    def moved(self):
+        self.version += 1
+
+    # Count of copies
+    def __len__(self):
+        return len(self.transforms)
+
+    # Returns cached (N, 3, 4) model-to-world matrices of every copy
+    def matrices(self):
+        if self._matrices is None or self._matrix_version != self.version:
+            self._matrices = transform_matrices(self.transforms)
+            self._matrix_version = self.version
+        return self._matrices
+
+    # -------------------------------------------------------------
+    # Returns (rows, distances) of copies whose bounding sphere is
+    # within render distance of camera and inside world frustum
+    # planes (see frustum_planes_world)
+    # -------------------------------------------------------------
+    def visible(self, camera, planes):
+        matrices = self.matrices()
+        centers = matrices[:, :, :3] @ self.mesh.center + matrices[:, :, 3]
+        radii = self.mesh.radius * np.abs(self.transforms[:, 6])
+
+        distances = np.linalg.norm(centers - (camera.x, camera.y, camera.z), axis=1)
+        inside = (centers @ planes[:, :3].T + planes[:, 3] >= -radii[:, None]).all(axis=1)
+        rows = np.flatnonzero(inside & (distances < camera.render_distance))
+        return rows, distances[rows]
+
+    # -------------------------------------------------------------
+    # Returns (colors, points, depths) triangles of every copy in
+    # view, like render_model_batch. Each copy draws the LOD level
+    # matching its size on screen, copies sharing a level are
+    # projected together, in chunks of INSTANCE_CHUNK_VERTICES.
+    # lights: SceneLights shading faces, file colors if empty
+    # -------------------------------------------------------------
+    def project(self, camera, scrn_w, scrn_h, lights=None):
+        rows, distances = self.visible(camera, frustum_planes_world(camera, scrn_w, scrn_h))
+        self.drawn = len(rows)
+
+        lods = self.mesh.lods
+        sizes = self.mesh.radius * np.abs(self.transforms[rows, 6]) * camera.focal / np.maximum(distances, 1e-6)
+        levels = select_lod_batch(self.lod_levels[rows], sizes, len(lods))
+        self.lod_levels[rows] = levels
+
+        matrices = self.matrices()
+        parts = []
+        for level in np.unique(levels).tolist():
+            level_rows = rows[levels == level]
+            chunk = max(1, INSTANCE_CHUNK_VERTICES // len(lods[level].vertices))
+            for a in range(0, len(level_rows), chunk):
+                chunk_matrices = matrices[level_rows[a:a + chunk]]
+                colors = lights.shade(lods[level], chunk_matrices) if lights else None
+                parts.append(render_instances_batch(camera, lods[level], chunk_matrices, scrn_w, scrn_h, colors))
+
+        if not parts:
+            return np.empty((0, 3), dtype=self.mesh.faces.dtype), np.empty((0, 6)), np.empty((0, 3))
+
+        colors, points, depths = zip(*parts)
+        return np.concatenate(colors), np.concatenate(points), np.concatenate(depths)
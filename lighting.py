@@ -0,0 +1,120 @@
+# ------------------------------------------------------------
+# Module for flat shading. Each face is lit once from its
+# normal, taken from the mesh and turned into world space with
+# the model matrix, and face colors are scaled by the light
+# reaching it. World is y-down, so a light shining down has a
+# positive y direction
+# ------------------------------------------------------------
+import numpy as np
+
+AMBIENT_LIGHT = 0.2  # Light every face gets, when a scene has lights but sets no ambient level
+LIGHT_KINDS = ("ambient", "directional", "point")
+LIGHT_VALUES = (1, 4, 5)  # Most values a light of each kind takes, see SceneLights.add
+
+
+# ------------------------------------------------------------
+# Returns (normals, centers) of mesh faces as (M, 3) arrays:
+# outward unit normals and centroids in model space. Faces are
+# wound clockwise seen from the front, as on screen
+# ------------------------------------------------------------
+def face_normals(vertices, faces):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    v1, v2, v3 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+
+    normals = np.cross(v3 - v1, v2 - v1)
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1)[:, None]
+    return normals, (v1 + v2 + v3) / 3
+
+
+# -------------------------------------------------------------
+# SCENE LIGHTS CLASS: Ambient level plus directional and point
+# lights of a scene, kept as arrays so every face of a model is
+# lit in one go. version is bumped by every change, for caches
+# of shaded faces
+# -------------------------------------------------------------
+class SceneLights:
+    def __init__(self):
+        self.version = 0
+        self.clear()
+
+    # Removes every light, leaving faces in their file colors
+    def clear(self):
+        self.ambient = None  # Ambient level, AMBIENT_LIGHT if None
+        self.directions = np.empty((0, 3))  # Unit directions directional lights shine in
+        self.direction_intensities = np.empty(0)
+        self.positions = np.empty((0, 3))  # Point light positions
+        self.point_intensities = np.empty(0)
+        self.point_ranges = np.empty(0)  # Distance at which a point light fades out
+        self.version += 1
+
+    # True if scene has any lights, unlit scenes skip shading
+    def __bool__(self):
+        return self.ambient is not None or len(self.directions) > 0 or len(self.positions) > 0
+
+    # Sets light every face gets
+    def set_ambient(self, level):
+        self.ambient = float(level)
+        self.version += 1
+
+    # Adds light shining along (dx, dy, dz) from infinitely far away
+    def add_directional(self, dx, dy, dz, intensity=1.0):
+        direction = np.array([dx, dy, dz], dtype=np.float64)
+        self.directions = np.vstack((self.directions, direction / np.linalg.norm(direction)))
+        self.direction_intensities = np.append(self.direction_intensities, intensity)
+        self.version += 1
+
+    # Adds light at (x, y, z) fading linearly to nothing at light_range
+    def add_point(self, x, y, z, intensity=1.0, light_range=10.0):
+        self.positions = np.vstack((self.positions, [x, y, z]))
+        self.point_intensities = np.append(self.point_intensities, intensity)
+        self.point_ranges = np.append(self.point_ranges, light_range)
+        self.version += 1
+
+    # Adds light of kind in LIGHT_KINDS from its scene file values
+    def add(self, kind, *values):
+        if kind == "ambient":
+            self.set_ambient(*values)
+        elif kind == "directional":
+            self.add_directional(*values)
+        elif kind == "point":
+            self.add_point(*values)
+        else:
+            raise ValueError("Unknown light kind: %s" % kind)
+
+    # ------------------------------------------------------------
+    # Returns light reaching faces, from 0 to 1, given world space
+    # unit normals and centers as (..., 3) arrays
+    # ------------------------------------------------------------
+    def brightness(self, normals, centers):
+        ambient = AMBIENT_LIGHT if self.ambient is None else self.ambient
+        light = np.full(normals.shape[:-1], ambient)
+
+        if len(self.directions):
+            facing = np.maximum(normals @ -self.directions.T, 0)
+            light += facing @ self.direction_intensities
+
+        if len(self.positions):
+            offsets = self.positions - centers[..., None, :]
+            distances = np.linalg.norm(offsets, axis=-1)
+            facing = np.maximum((normals[..., None, :] * offsets).sum(axis=-1), 0) / np.maximum(distances, 1e-9)
+            falloff = np.maximum(1 - distances / self.point_ranges, 0)
+            light += (facing * falloff) @ self.point_intensities
+
+        return np.minimum(light, 1)
+
+    # -------------------------------------------------------------
+    # Returns int face colors of mesh lit by the scene, placed by a
+    # (3, 4) model matrix or by (K, 3, 4) matrices of K copies, as
+    # (M, 3) or (K, M, 3). Normals turn with the rotation, the
+    # scale is uniform so normalizing undoes it
+    # -------------------------------------------------------------
+    def shade(self, mesh, matrices):
+        rotations, offsets = matrices[..., :3], matrices[..., 3]
+
+        normals = mesh.normals @ np.swapaxes(rotations, -1, -2)
+        normals /= np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-12)
+        centers = mesh.face_centers @ np.swapaxes(rotations, -1, -2) + offsets[..., None, :]
+
+        light = self.brightness(normals, centers)
+        return (mesh.faces[:, 3:6] * light[..., None]).astype(mesh.faces.dtype)
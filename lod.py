@@ -0,0 +1,129 @@
+# ------------------------------------------------------------
+# Module for level of detail. Meshes are simplified by edge
+# collapse into a chain of coarser levels, and each model picks
+# the level to draw from its size on screen
+# ------------------------------------------------------------
+import numpy as np
+
+LOD_LEVELS = 3  # Most simplified levels built after the full mesh
+LOD_RATIO = 0.5  # Faces kept by each level, of the level before it
+LOD_MIN_FACES = 16  # Meshes with fewer faces aren't simplified further
+
+LOD_SIZES = (96, 48, 24)  # Screen radius in pixels below which level i + 1 is used
+LOD_HYSTERESIS = 0.15  # Fraction a size must pass a threshold by before switching
+
+
+# ------------------------------------------------------------
+# Collapses up to max_collapses of the shortest edges of a mesh
+# to their midpoints, no two sharing a vertex. Returns compacted
+# (vertices, faces), faces that became degenerate or duplicated
+# are dropped and the rest keep their colors
+# ------------------------------------------------------------
+def collapse_edges(vertices, faces, max_collapses):
+    vertices = np.array(vertices, dtype=np.float64)
+    faces = np.array(faces, dtype=np.int64)
+    tri = faces[:, :3]
+
+    edges = np.concatenate((tri[:, [0, 1]], tri[:, [1, 2]], tri[:, [2, 0]]))
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+    lengths = np.linalg.norm(vertices[edges[:, 0]] - vertices[edges[:, 1]], axis=1)
+    edges = edges[np.argsort(lengths, kind="stable")]
+
+    remap = np.arange(len(vertices))
+    used = np.zeros(len(vertices), dtype=bool)
+    collapsed = 0
+    for a, b in edges.tolist():
+        if used[a] or used[b]:
+            continue
+        used[a] = used[b] = True
+
+        vertices[a] = (vertices[a] + vertices[b]) / 2
+        remap[b] = a
+        collapsed += 1
+        if collapsed >= max_collapses:
+            break
+
+    tri = remap[tri]
+    keep = (tri[:, 0] != tri[:, 1]) & (tri[:, 1] != tri[:, 2]) & (tri[:, 2] != tri[:, 0])
+    faces, tri = faces[keep], tri[keep]
+
+    # Two faces over the same three vertices, keeps the first
+    _, first = np.unique(np.sort(tri, axis=1), axis=0, return_index=True)
+    first.sort()
+    faces, tri = faces[first], tri[first]
+
+    # Drops vertices no face uses anymore
+    kept, tri = np.unique(tri, return_inverse=True)
+    faces[:, :3] = tri.reshape(-1, 3)
+    return vertices[kept], faces
+
+
+# -----------------------------------------------------------
+# Returns (vertices, faces) simplified to about target_faces
+# faces, collapsing edges in passes until it gets there or
+# can't simplify further
+# -----------------------------------------------------------
+def decimate(vertices, faces, target_faces):
+    while len(faces) > target_faces:
+        # Each collapse removes about two faces
+        collapses = max(1, (len(faces) - target_faces) // 2)
+        new_vertices, new_faces = collapse_edges(vertices, faces, collapses)
+        if len(new_faces) >= len(faces) or len(new_faces) == 0:
+            break
+        vertices, faces = new_vertices, new_faces
+    return vertices, faces
+
+
+# ------------------------------------------------------------
+# Returns list of simplified (vertices, faces) levels of a mesh,
+# coarsest last, not including the full mesh. Stops early once
+# a level is below LOD_MIN_FACES or stops shrinking
+# ------------------------------------------------------------
+def build_lod_chain(vertices, faces, levels=LOD_LEVELS, ratio=LOD_RATIO):
+    chain = []
+    for level in range(levels):
+        if len(faces) < LOD_MIN_FACES:
+            break
+        new_vertices, new_faces = decimate(vertices, faces, int(len(faces) * ratio))
+        if len(new_faces) >= len(faces):
+            break
+        vertices, faces = new_vertices, new_faces
+        chain.append((vertices, faces))
+    return chain
+
+
+# -------------------------------------------------------------
+# Returns level to draw for a model drawn at level last frame,
+# whose bounding sphere covers size pixels of screen radius.
+# Moves only once size is past a threshold by LOD_HYSTERESIS,
+# so models near a threshold don't flicker between levels
+# -------------------------------------------------------------
+def select_lod(level, size, levels, sizes=LOD_SIZES, hysteresis=LOD_HYSTERESIS):
+    level = min(level, levels - 1)
+    while level > 0 and size > sizes[level - 1] * (1 + hysteresis):
+        level -= 1
+    while level < min(levels - 1, len(sizes)) and size < sizes[level] * (1 - hysteresis):
+        level += 1
+    return level
+
+
+# ------------------------------------------------------------
+# Array version of select_lod: returns levels to draw for many
+# copies of one mesh drawn at levels last frame, with screen
+# radius sizes, following the same thresholds and hysteresis
+# ------------------------------------------------------------
+def select_lod_batch(levels, sizes, count, thresholds=LOD_SIZES, hysteresis=LOD_HYSTERESIS):
+    levels = np.minimum(levels, count - 1)
+    steps = min(count - 1, len(thresholds))
+    if steps <= 0:
+        return np.zeros_like(levels)
+
+    # Size above which level i moves to i - 1, and below which it moves to i + 1
+    up = np.array([np.inf] + [thresholds[a] * (1 + hysteresis) for a in range(steps)])
+    down = np.array([thresholds[a] * (1 - hysteresis) for a in range(steps)] + [-np.inf])
+
+    for a in range(steps):
+        levels = levels - (sizes > up[levels])
+    for a in range(steps):
+        levels = levels + (sizes < down[levels])
+    return levels
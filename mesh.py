@@ -0,0 +1,251 @@
+# ------------------------------------------------------------
+# Module for mesh assets: loads model files into read-only
+# geometry that is shared by every model using the same file
+# ------------------------------------------------------------
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from meshbin import *
+from meshimport import *
+from lod import *
+from lighting import face_normals
+
+MODEL_PATH = "models/"  # Folder model files are loaded from
+CACHE_FOLDER = ".cache/"  # Sub-folder of MODEL_PATH holding converted binary meshes
+
+
+# ----------------------------------------------------------------
+# Loads file, removing comments and returning text string of data
+# ----------------------------------------------------------------
+def load_file(file_name, file_path):
+    lines = []
+
+    with open(file_path + file_name, "r") as open_file:
+        # Removing comments in file from data
+        for line in open_file:
+            if (line.find("#") == -1):
+                lines.append(line)
+
+    return "".join(lines)
+
+
+# -----------------------------------------------------------
+# Returns vertex and face arrays parsed from model file text
+# vertices[x, y, z]
+# faces[vertID1, vertID2, vertID3, r, g, b], colors 0 - 255
+# -----------------------------------------------------------
+def parse_model(raw_data):
+    verts = raw_data
+    faces = raw_data
+
+    verts = verts[verts.find("Model Vertices\n") + 15:verts.find("Model Faces\n") - 1]
+    verts = verts.split("\n")  # Splits model into coordinate triplets
+
+    vertices = []
+    for a in range(len(verts)):
+        vertices.append(verts[a].split(","))
+
+    # Converts vertex coordinates to floats
+    for a in range(len(vertices)):
+        for b in range(0, 3):
+            vertices[a][b] = float(vertices[a][b])
+
+    faces = faces[faces.find("Model Faces\n") + 12:]
+    faces = faces.split("\n")  # Splits model into coordinate triplets
+
+    face_list = []
+    for a in range(len(faces)):
+        face_list.append(faces[a].split(","))
+
+    for a in range(
+            len(face_list)):  # Converts face point coordinates to ints
+        for b in range(0, 6):
+            face_list[a][b] = int(face_list[a][b])
+
+    vertices = np.array(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.array(face_list, dtype=np.int64).reshape(-1, 6)
+
+    # Colors out of range would wrap once stored as uint32 in the binary mesh cache
+    np.clip(faces[:, 3:6], 0, 255, out=faces[:, 3:6])
+    return vertices, faces
+
+
+# ---------------------------------------------------------
+# MESH CLASS: Geometry of one model file, vertices and
+# faces are read-only so any number of models can share it
+# ---------------------------------------------------------
+class Mesh:
+    def __init__(self, name, vertices, faces, mtime=0):
+        self.name = name  # Name of Model File
+        self.mtime = mtime  # Modification time of file when loaded
+
+        self.vertices = vertices  # Rest-pose vertices, (N, 3) float array
+        self.faces = faces  # Faces, (M, 6) int array
+
+        self.vertices.flags.writeable = False
+        self.faces.flags.writeable = False
+
+        # Bounding volumes in model space, used for culling
+        self.aabb_min = self.vertices.min(axis=0).astype(np.float64)
+        self.aabb_max = self.vertices.max(axis=0).astype(np.float64)
+        self.center = (self.aabb_min + self.aabb_max) / 2  # Bounding sphere center
+        self.radius = float(np.sqrt(((self.vertices - self.center) ** 2).sum(axis=1).max()))
+        self.origin_radius = float(np.sqrt((self.vertices.astype(np.float64) ** 2).sum(axis=1).max()))  # Around model origin
+
+        # Model space face normals and centroids, computed once for flat shading
+        self.normals, self.face_centers = face_normals(self.vertices, self.faces)
+
+        self.lods = [self]  # Levels of detail, this full mesh first then coarser ones
+
+
+# ------------------------------------------------------------
+# Returns vertex and face arrays of a model file, read by the
+# OBJ / PLY importers or parsed as an engine text model
+# ------------------------------------------------------------
+def read_model(name, path=MODEL_PATH):
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".obj":
+        return load_obj(path + name)
+    if extension == ".ply":
+        return load_ply(path + name)
+    return parse_model(load_file(name, path))
+
+
+# ------------------------------------------------------------
+# Returns path of binary cache file for a model, level > 0 for
+# one of its simplified LOD levels
+# ------------------------------------------------------------
+def cached_mesh_name(name, path=MODEL_PATH, level=0):
+    if level:
+        return path + CACHE_FOLDER + name + ".lod%d.pgm" % level
+    return path + CACHE_FOLDER + name + ".pgm"
+
+
+# Returns Mesh with its lods set from list of (vertices, faces) levels
+def mesh_with_lods(name, vertices, faces, mtime, levels):
+    mesh = Mesh(name, vertices, faces, mtime)
+    for lod_vertices, lod_faces in levels:
+        mesh.lods.append(Mesh(name, lod_vertices, lod_faces, mtime))
+    return mesh
+
+
+# ------------------------------------------------------------
+# Converts model file to the binary mesh format, along with
+# its LOD levels, model file stays the source. Levels are
+# written first so a full mesh file always has all its levels.
+# Returns name of written binary file
+# ------------------------------------------------------------
+def convert_model(name, path=MODEL_PATH):
+    mtime = os.path.getmtime(path + name)
+    vertices, faces = read_model(name, path)
+    levels = build_lod_chain(vertices, faces)
+
+    bin_name = cached_mesh_name(name, path)
+    os.makedirs(os.path.dirname(bin_name), exist_ok=True)
+    for level, (lod_vertices, lod_faces) in enumerate(levels, 1):
+        write_mesh_bin(cached_mesh_name(name, path, level), lod_vertices, lod_faces, mtime)
+    write_mesh_bin(bin_name, vertices, faces, mtime, len(levels))
+    return bin_name
+
+
+# ---------------------------------------------------------------
+# Returns Mesh for a model file, with its LOD levels. Loads the
+# memory-mapped binary cache, converting the text file first if
+# the cache is missing or older than it. Falls back to parsing
+# text and simplifying in memory if it can't write
+# ---------------------------------------------------------------
+def load_mesh(name, path=MODEL_PATH):
+    mtime = os.path.getmtime(path + name)
+    bin_name = cached_mesh_name(name, path)
+
+    header = None
+    if os.path.exists(bin_name):
+        header = read_mesh_header(bin_name)
+
+    if header is None or header[2] != mtime:
+        try:
+            convert_model(name, path)
+        except OSError:
+            vertices, faces = read_model(name, path)
+            return mesh_with_lods(name, vertices, faces, mtime, build_lod_chain(vertices, faces))
+
+    vertices, faces, _ = read_mesh_bin(bin_name)
+    lod_count = read_mesh_header(bin_name)[3]
+    levels = [read_mesh_bin(cached_mesh_name(name, path, level))[:2] for level in range(1, lod_count + 1)]
+    return mesh_with_lods(name, vertices, faces, mtime, levels)
+
+
+# -------------------------------------------------------------
+# MESH CACHE CLASS: Registry of loaded meshes keyed by model
+# name. Keeps the max_meshes most recently used meshes loaded,
+# older ones are released once no model is using them anymore
+# -------------------------------------------------------------
+class MeshCache:
+    def __init__(self, max_meshes=32, path=MODEL_PATH):
+        self.max_meshes = max_meshes
+        self.path = path
+
+        self.recent = OrderedDict()  # Most recently used meshes, oldest first
+        self.live = weakref.WeakValueDictionary()  # Every mesh still held by a model
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # Guards recent and live, see get
+
+    # ------------------------------------------------------------
+    # Returns shared Mesh for model name, reloading it if the file
+    # has changed. Safe to call from a loader thread, files are
+    # read outside the lock so the main thread isn't held up
+    # ------------------------------------------------------------
+    def get(self, name):
+        mtime = os.path.getmtime(self.path + name)
+
+        with self.lock:
+            mesh = self.recent.get(name)
+            if mesh is None:
+                mesh = self.live.get(name)
+
+        loaded = mesh is None or mesh.mtime != mtime
+        if loaded:
+            mesh = load_mesh(name, self.path)
+
+        with self.lock:
+            if loaded:
+                self.misses += 1
+                self.live[name] = mesh
+            else:
+                self.hits += 1
+
+            self.recent[name] = mesh
+            self.recent.move_to_end(name)
+            self.evict()
+        return mesh
+
+    # Drops least recently used meshes past max_meshes
+    def evict(self):
+        while len(self.recent) > self.max_meshes:
+            self.recent.popitem(last=False)
+
+    # Drops every mesh not held by a model
+    def clear(self):
+        with self.lock:
+            self.recent.clear()
+
+
+mesh_cache = MeshCache()  # Shared by every Model
+
+
+# Converts model files to binary: python mesh.py [model names], default all
+if __name__ == "__main__":
+    import sys
+
+    names = sys.argv[1:]
+    if not names:
+        names = [name for name in sorted(os.listdir(MODEL_PATH))
+                 if os.path.isfile(MODEL_PATH + name)]
+
+    for name in names:
+        print(name, "->", convert_model(name))
@@ -0,0 +1,82 @@
+# ------------------------------------------------------------
+# Module for the binary mesh format. Files are a 32 byte header
+# followed by packed float32 vertices and uint32 faces, and are
+# memory-mapped on load so the arrays are views of the file
+#
+# Header: magic, version, vertex count, face count, source mtime,
+#         count of LOD level files stored next to it
+# Vertices: vertex count * (x, y, z) float32
+# Faces: face count * (v1, v2, v3, r, g, b) uint32
+# ------------------------------------------------------------
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+MESH_MAGIC = b"PGM1"
+MESH_VERSION = 2
+
+HEADER = struct.Struct("<4sIIIdI4x")  # Padded to 32 bytes, keeps blocks aligned
+
+VERTEX_DTYPE = np.dtype("<f4")
+FACE_DTYPE = np.dtype("<u4")
+
+
+# ------------------------------------------------------------
+# Writes vertex and face arrays to binary mesh file. Written to
+# a temp file first, so a mapped old version is never clobbered.
+# Temp name is per thread, a scene loader thread may convert the
+# same model as the main thread
+# ------------------------------------------------------------
+def write_mesh_bin(file_name, vertices, faces, source_mtime=0, lod_count=0):
+    vertices = np.ascontiguousarray(vertices, dtype=VERTEX_DTYPE).reshape(-1, 3)
+    faces = np.ascontiguousarray(faces, dtype=FACE_DTYPE).reshape(-1, 6)
+
+    temp_name = "%s.%d.%d.tmp" % (file_name, os.getpid(), threading.get_ident())
+    with open(temp_name, "wb") as out:
+        out.write(HEADER.pack(MESH_MAGIC, MESH_VERSION, len(vertices), len(faces), source_mtime, lod_count))
+        out.write(vertices.tobytes())
+        out.write(faces.tobytes())
+    os.replace(temp_name, file_name)
+
+
+# -----------------------------------------------------------
+# Returns header of binary mesh file as (vertex count, face
+# count, source mtime, LOD count), or None if it is not a
+# mesh file of this version
+# -----------------------------------------------------------
+def read_mesh_header(file_name):
+    with open(file_name, "rb") as open_file:
+        data = open_file.read(HEADER.size)
+
+    if len(data) < HEADER.size:
+        return None
+
+    magic, version, vertex_count, face_count, source_mtime, lod_count = HEADER.unpack(data)
+    if magic != MESH_MAGIC or version != MESH_VERSION:
+        return None
+    return vertex_count, face_count, source_mtime, lod_count
+
+
+# ---------------------------------------------------------------
+# Memory-maps binary mesh file, returns read-only (N, 3) vertex
+# and (M, 6) face arrays that are zero-copy views of the mapping
+# ---------------------------------------------------------------
+def read_mesh_bin(file_name):
+    header = read_mesh_header(file_name)
+    if header is None:
+        raise ValueError("Not a binary mesh file: " + file_name)
+    vertex_count, face_count, source_mtime, lod_count = header
+
+    with open(file_name, "rb") as open_file:
+        mapping = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Arrays keep the mapping alive, it is closed once both are freed
+    offset = HEADER.size
+    vertices = np.frombuffer(mapping, VERTEX_DTYPE, vertex_count * 3, offset).reshape(-1, 3)
+    offset += vertices.nbytes
+    faces = np.frombuffer(mapping, FACE_DTYPE, face_count * 6, offset).reshape(-1, 6)
+
+    return vertices, faces, source_mtime
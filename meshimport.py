@@ -0,0 +1,535 @@
+# ------------------------------------------------------------
+# Module for importing Wavefront OBJ and PLY meshes. Files are
+# streamed in chunks of lines / records, so memory stays at
+# about one chunk plus the final arrays, never the whole text
+#
+# Both return (N, 3) float32 vertices and (M, 6) uint32 faces
+# in the engine layout: faces[vertID1, vertID2, vertID3, r, g, b]
+# ------------------------------------------------------------
+import os
+import struct
+
+import numpy as np
+
+CHUNK_SIZE = 65536  # Lines / records parsed per chunk
+DEFAULT_COLOR = (200, 200, 200)  # Face color when file has no material or vertex colors
+
+
+# ------------------------------------------------------------
+# GROWABLE ARRAY CLASS: Rows are appended a chunk at a time,
+# the buffer grows in place by 1.5x and is trimmed when done
+# ------------------------------------------------------------
+class GrowableArray:
+    def __init__(self, columns, dtype, capacity=1024):
+        self.data = np.empty((capacity, columns), dtype=dtype)
+        self.count = 0
+
+    # Appends (K, columns) rows
+    def extend(self, rows):
+        needed = self.count + len(rows)
+        if needed > len(self.data):
+            capacity = max(needed, int(len(self.data) * 1.5))
+            self.data.resize((capacity, self.data.shape[1]), refcheck=False)
+        self.data[self.count:needed] = rows
+        self.count = needed
+
+    # Returns trimmed array, builder must not be used after
+    def finish(self):
+        self.data.resize((self.count, self.data.shape[1]), refcheck=False)
+        return self.data
+
+
+# ----------------------------------------------------------
+# Returns faces of fan-triangulated polygon, with its color
+# ----------------------------------------------------------
+def triangulate(indices, color):
+    r, g, b = color
+    first = indices[0]
+    return [(first, indices[k], indices[k + 1], r, g, b) for k in range(1, len(indices) - 1)]
+
+
+# --------------------------------------------------------
+# Returns {material name: (r, g, b)} from OBJ .mtl file,
+# using the diffuse color (Kd) of each material
+# --------------------------------------------------------
+def load_mtl(file_name):
+    materials = {}
+    current = None
+
+    with open(file_name, "r") as open_file:
+        for line in open_file:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "newmtl":
+                current = " ".join(tokens[1:])
+                materials[current] = DEFAULT_COLOR
+            elif tokens[0] == "Kd" and current is not None:
+                materials[current] = tuple(
+                    int(min(1.0, max(0.0, float(c))) * 255) for c in tokens[1:4])
+    return materials
+
+
+# ----------------------------------------------------------------
+# Imports Wavefront OBJ file. n-gons are fan triangulated, face
+# colors come from the diffuse color of the active material, or
+# from vertex colors ("v x y z r g b") when no material is used.
+# flip_y converts from OBJ's y-up to the engine's y-down axis
+# ----------------------------------------------------------------
+def load_obj(file_name, flip_y=True, chunk_size=CHUNK_SIZE):
+    vertices = GrowableArray(3, np.float32)
+    faces = GrowableArray(6, np.uint32)
+    vertex_colors = None  # Filled if the file has per-vertex colors
+
+    materials = {}
+    color = None  # Color of active material
+
+    vert_tokens = []  # Unparsed coordinates of current chunk
+    color_tokens = []
+    face_rows = []  # Triangles of current chunk
+    vertex_count = 0
+
+    # Parses buffered vertex lines into the vertex array
+    def flush_vertices():
+        nonlocal vertex_colors
+        if vert_tokens:
+            vertices.extend(np.array(vert_tokens, dtype=np.float32).reshape(-1, 3))
+            vert_tokens.clear()
+        if color_tokens:
+            if vertex_colors is None:
+                vertex_colors = GrowableArray(3, np.float32)
+            vertex_colors.extend(np.array(color_tokens, dtype=np.float32).reshape(-1, 3))
+            color_tokens.clear()
+
+    # Appends buffered triangles to the face array
+    def flush_faces():
+        if face_rows:
+            faces.extend(np.array(face_rows, dtype=np.int64))
+            face_rows.clear()
+
+    folder = os.path.dirname(file_name)
+
+    with open(file_name, "r") as open_file:
+        for line in open_file:
+            if line.startswith("v "):
+                tokens = line.split()
+                vert_tokens.extend(tokens[1:4])
+                if len(tokens) >= 7:
+                    color_tokens.extend(tokens[4:7])
+                vertex_count += 1
+                if len(vert_tokens) >= chunk_size * 3:
+                    flush_vertices()
+
+            elif line.startswith("f "):
+                indices = []
+                for token in line.split()[1:]:
+                    index = int(token.split("/")[0])
+                    # Negative indices count back from the latest vertex
+                    indices.append(index - 1 if index > 0 else vertex_count + index)
+
+                # Vertex colored faces are filled in once all colors are known
+                face_color = color if color is not None else (-1, -1, -1)
+                face_rows.extend(triangulate(indices, face_color))
+                if len(face_rows) >= chunk_size:
+                    flush_faces()
+
+            elif line.startswith("usemtl"):
+                color = materials.get(line[6:].strip(), DEFAULT_COLOR)
+
+            elif line.startswith("mtllib"):
+                mtl_name = os.path.join(folder, line[6:].strip())
+                if os.path.exists(mtl_name):
+                    materials.update(load_mtl(mtl_name))
+
+    flush_vertices()
+    flush_faces()
+
+    vertices = vertices.finish()
+    faces = faces.finish()
+
+    if flip_y:
+        vertices[:, 1] *= -1
+
+    # Faces with no material take the mean of their vertex colors
+    uncolored = faces[:, 3] == np.uint32(0xFFFFFFFF)
+    if uncolored.any():
+        if vertex_colors is not None and vertex_colors.count == len(vertices):
+            colors = vertex_colors.finish()
+            if colors.max() <= 1.0:
+                colors = colors * 255
+            tris = faces[uncolored, :3]
+            faces[uncolored, 3:6] = (colors[tris[:, 0]] + colors[tris[:, 1]] + colors[tris[:, 2]]) / 3
+        else:
+            faces[uncolored, 3:6] = DEFAULT_COLOR
+
+    return vertices, faces
+
+
+# ---- PLY scalar types, by every name the format allows ----
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+
+# --------------------------------------------------------------
+# Returns (format, elements) from PLY header, leaves file at the
+# first data byte. elements is a list of (name, count, props),
+# props a list of (name, type) or (name, (count type, type))
+# --------------------------------------------------------------
+def read_ply_header(open_file):
+    if open_file.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+
+    file_format = None
+    elements = []
+    while True:
+        line = open_file.readline()
+        if not line:
+            raise ValueError("PLY header has no end_header")
+        tokens = line.decode("ascii").split()
+        if not tokens:
+            continue
+        if tokens[0] == "format":
+            file_format = tokens[1]
+        elif tokens[0] == "element":
+            elements.append((tokens[1], int(tokens[2]), []))
+        elif tokens[0] == "property":
+            if tokens[1] == "list":
+                elements[-1][2].append((tokens[4], (PLY_TYPES[tokens[2]], PLY_TYPES[tokens[3]])))
+            else:
+                elements[-1][2].append((tokens[2], PLY_TYPES[tokens[1]]))
+        elif tokens[0] == "end_header":
+            return file_format, elements
+
+
+# -------------------------------------------------------------
+# Returns (x, y, z) float32 vertices and (r, g, b) colors (or
+# None) from parsed PLY vertex records, as a structured array.
+# Float colors are 0 - 1 in PLY files, scaled to 0 - 255 here
+# -------------------------------------------------------------
+def ply_vertex_arrays(records):
+    vertices = np.column_stack((records["x"], records["y"], records["z"])).astype(np.float32)
+
+    colors = None
+    names = records.dtype.names
+    if "red" in names and "green" in names and "blue" in names:
+        colors = np.column_stack((records["red"], records["green"], records["blue"])).astype(np.float32)
+        if records.dtype["red"].kind == "f":
+            colors *= 255
+    return vertices, colors
+
+
+# ---------------------------------------------------------------
+# Imports PLY file, ascii or binary. Polygons are fan triangulated
+# and colored from face colors, else the mean of vertex colors.
+# flip_y converts from the usual y-up to the engine's y-down axis
+# ---------------------------------------------------------------
+def load_ply(file_name, flip_y=True, chunk_size=CHUNK_SIZE):
+    with open(file_name, "rb") as open_file:
+        file_format, elements = read_ply_header(open_file)
+
+        if file_format == "ascii":
+            reader = PlyAsciiReader(open_file)
+        else:
+            endian = "<" if file_format == "binary_little_endian" else ">"
+            reader = PlyBinaryReader(open_file, endian)
+
+        vertices = None
+        vertex_colors = None
+        faces = GrowableArray(6, np.uint32)
+
+        for name, count, props in elements:
+            if name == "vertex":
+                vertices = GrowableArray(3, np.float32)
+                for records in reader.read_scalars(props, count, chunk_size):
+                    chunk_vertices, chunk_colors = ply_vertex_arrays(records)
+                    vertices.extend(chunk_vertices)
+                    if chunk_colors is not None:
+                        if vertex_colors is None:
+                            vertex_colors = GrowableArray(3, np.float32)
+                        vertex_colors.extend(chunk_colors)
+
+            elif name == "face":
+                for polygons, colors in reader.read_faces(props, count, chunk_size):
+                    faces.extend(triangulate_chunk(polygons, colors))
+
+            else:
+                reader.skip(props, count)
+
+    if vertices is None:
+        raise ValueError("PLY file has no vertex element: %s" % file_name)
+    vertices = vertices.finish()
+    faces = faces.finish()
+
+    if flip_y:
+        vertices[:, 1] *= -1
+
+    # Faces without their own color take the mean of their vertex colors
+    uncolored = faces[:, 3] == np.uint32(0xFFFFFFFF)
+    if uncolored.any():
+        if vertex_colors is not None:
+            colors = vertex_colors.finish()
+            tris = faces[uncolored, :3]
+            faces[uncolored, 3:6] = (colors[tris[:, 0]] + colors[tris[:, 1]] + colors[tris[:, 2]]) / 3
+        else:
+            faces[uncolored, 3:6] = DEFAULT_COLOR
+
+    return vertices, faces
+
+
+# ------------------------------------------------------------------
+# Returns (K, 6) triangles from a chunk of polygons. polygons is an
+# (P, n) index array when every polygon has n sides, a tuple of the
+# indices of all polygons back to back and their (P,) side counts,
+# or a list of index lists. colors is (P, 3) or None (stored as -1)
+# ------------------------------------------------------------------
+def triangulate_chunk(polygons, colors):
+    sides = None
+    if isinstance(polygons, tuple):
+        polygons, sides = polygons
+        if len(sides) and (sides == sides[0]).all():
+            polygons, sides = polygons.reshape(len(sides), sides[0]), None
+
+    if colors is None:
+        colors = np.full((len(polygons) if sides is None else len(sides), 3), -1, dtype=np.int64)
+
+    if sides is not None:
+        # Fan triangle k of every polygon, counted from its first index
+        fans = np.maximum(sides - 2, 0)
+        face = np.repeat(np.arange(len(sides)), fans)
+        k = np.arange(fans.sum()) - np.repeat(np.cumsum(fans) - fans, fans) + 1
+        first = (np.cumsum(sides) - sides)[face]
+        return np.column_stack((polygons[first], polygons[first + k], polygons[first + k + 1], colors[face]))
+
+    if isinstance(polygons, np.ndarray):
+        sides = polygons.shape[1]
+        if sides < 3:
+            return np.empty((0, 6), dtype=np.int64)  # Points and edges have no area to draw
+        tris = []
+        for k in range(1, sides - 1):
+            tris.append(np.column_stack((polygons[:, 0], polygons[:, k], polygons[:, k + 1], colors)))
+        # Keeps the triangles of each polygon together
+        return np.stack(tris, axis=1).reshape(-1, 6)
+
+    rows = []
+    for indices, color in zip(polygons, colors.tolist()):
+        rows.extend(triangulate(indices, color))
+    return np.array(rows, dtype=np.int64).reshape(-1, 6)
+
+
+# -----------------------------------------------------
+# Returns index of face list property, and the names of
+# the scalar color properties (if any) in face records
+# -----------------------------------------------------
+def ply_face_layout(props):
+    list_index = next(a for a, (name, kind) in enumerate(props) if isinstance(kind, tuple))
+    names = [name for name, kind in props]
+    has_color = "red" in names and "green" in names and "blue" in names
+    return list_index, has_color
+
+
+# --------------------------------------------------
+# PLY ASCII READER CLASS: reads element records as
+# lines of whitespace separated values, by chunk
+# --------------------------------------------------
+class PlyAsciiReader:
+    def __init__(self, open_file):
+        self.file = open_file
+
+    # Yields chunks of scalar-only records as structured arrays
+    def read_scalars(self, props, count, chunk_size):
+        dtype = np.dtype([(name, kind) for name, kind in props])
+        while count > 0:
+            lines = [self.file.readline() for a in range(min(count, chunk_size))]
+            count -= len(lines)
+
+            values = np.array(b" ".join(lines).split(), dtype=np.float64).reshape(len(lines), -1)
+            records = np.empty(len(lines), dtype=dtype)
+            for a, name in enumerate(dtype.names):
+                records[name] = values[:, a]
+            yield records
+
+    # Yields chunks of (list of index lists, (P, 3) colors or None)
+    def read_faces(self, props, count, chunk_size):
+        list_index, has_color = ply_face_layout(props)
+        names = [name for name, kind in props]
+
+        while count > 0:
+            polygons = []
+            colors = [] if has_color else None
+            for a in range(min(count, chunk_size)):
+                tokens = self.file.readline().split()
+
+                # Walks properties in order, list properties are count-prefixed
+                values = {}
+                position = 0
+                for b, (name, kind) in enumerate(props):
+                    if b == list_index:
+                        sides = int(tokens[position])
+                        polygons.append([int(t) for t in tokens[position + 1:position + 1 + sides]])
+                        position += 1 + sides
+                    elif isinstance(kind, tuple):
+                        position += 1 + int(tokens[position])
+                    else:
+                        values[name] = tokens[position]
+                        position += 1
+                if has_color:
+                    colors.append((int(values["red"]), int(values["green"]), int(values["blue"])))
+            count -= len(polygons)
+
+            if has_color:
+                colors = np.array(colors, dtype=np.int64)
+            yield polygons, colors
+
+    # Skips records of an unused element
+    def skip(self, props, count):
+        for a in range(count):
+            self.file.readline()
+
+
+# ------------------------------------------------------------
+# PLY BINARY READER CLASS: reads element records straight from
+# chunks of file bytes. Scalar-only elements are fixed size and
+# viewed as structured arrays, elements with list properties are
+# walked record by record inside each chunk to find where every
+# property starts, then gathered into arrays all at once
+# ------------------------------------------------------------
+class PlyBinaryReader:
+    def __init__(self, open_file, endian):
+        self.file = open_file
+        self.endian = endian
+
+    # Returns structured dtype of scalar props
+    def scalar_dtype(self, props):
+        return np.dtype([(name, self.endian + kind) for name, kind in props])
+
+    # Yields chunks of scalar-only records as structured arrays
+    def read_scalars(self, props, count, chunk_size):
+        dtype = self.scalar_dtype(props)
+        while count > 0:
+            amount = min(count, chunk_size)
+            records = np.frombuffer(self.file.read(amount * dtype.itemsize), dtype=dtype)
+            count -= amount
+            yield records
+
+    # -------------------------------------------------------------
+    # Returns (segments, places) of records with list properties.
+    # A record is split into segments of fixed size scalars, each
+    # ended by one list: (fixed bytes, count struct, item size),
+    # count struct None for the last one if no list ends it.
+    # places: {name: (segment, byte offset in it, dtype)}, for
+    # lists the offset and dtype are those of the count
+    # -------------------------------------------------------------
+    def record_layout(self, props):
+        segments = []
+        places = {}
+        fixed = 0
+        for name, kind in props:
+            if isinstance(kind, tuple):
+                count_dtype = np.dtype(self.endian + kind[0])
+                places[name] = (len(segments), fixed, count_dtype)
+                unpack = struct.Struct(self.endian + count_dtype.char).unpack_from
+                segments.append((fixed, unpack, count_dtype.itemsize, np.dtype(kind[1]).itemsize))
+                fixed = 0
+            else:
+                places[name] = (len(segments), fixed, np.dtype(self.endian + kind))
+                fixed += np.dtype(kind).itemsize
+        segments.append((fixed, None, 0, 0))
+        return segments, places
+
+    # ------------------------------------------------------------
+    # Yields (data, starts) chunks of records with list props,
+    # data the bytes read and starts a (P, segments) array of the
+    # offset in data where each segment of each record begins.
+    # Each chunk is read once, a record cut off at its end is
+    # carried over to the front of the next chunk. Leaves the
+    # file just after the last record
+    # ------------------------------------------------------------
+    def read_records(self, segments, count, chunk_size):
+        record_size = sum(fixed + count_size + 3 * item_size for fixed, unpack, count_size, item_size in segments)
+        tail = b""
+        while count > 0:
+            amount = min(count, chunk_size)
+            data = tail + self.file.read(max(amount * record_size - len(tail), record_size))
+            starts, used = self.walk_records(data, segments, amount)
+
+            if not starts:
+                if len(data) == len(tail):
+                    raise ValueError("PLY file ends inside an element")
+                tail = data
+                record_size *= 2  # Record larger than guessed, reads more
+                continue
+
+            walked = len(starts) // len(segments)
+            record_size = max(record_size, -(-used // walked))
+            count -= walked
+            tail = data[used:]
+            yield data, np.array(starts, dtype=np.int64).reshape(walked, len(segments))
+
+        self.file.seek(-len(tail), os.SEEK_CUR)
+
+    # Returns (flat list of segment starts, bytes used) of up to amount whole records at the front of data
+    def walk_records(self, data, segments, amount):
+        starts = []
+        end = len(data)
+        position = 0
+        for a in range(amount):
+            record = []
+            at = position
+            for fixed, unpack, count_size, item_size in segments:
+                record.append(at)
+                at += fixed
+                if unpack is not None:
+                    if at + count_size > end:
+                        return starts, position
+                    at += count_size + unpack(data, at)[0] * item_size
+            if at > end:
+                break
+            starts.extend(record)
+            position = at
+        return starts, position
+
+    # Yields chunks of (flat index array, (P,) side counts), (P, 3) colors or None
+    def read_faces(self, props, count, chunk_size):
+        list_index, has_color = ply_face_layout(props)
+        list_name, (count_type, index_type) = props[list_index]
+        segments, places = self.record_layout(props)
+
+        for data, starts in self.read_records(segments, count, chunk_size):
+            data = np.frombuffer(data, dtype=np.uint8)
+
+            segment, offset, count_dtype = places[list_name]
+            at = starts[:, segment] + offset
+            sides = gather_values(data, at, count_dtype).astype(np.int64)
+            indices = gather_values(data, at + count_dtype.itemsize, np.dtype(self.endian + index_type), sides)
+
+            colors = None
+            if has_color:
+                colors = np.column_stack([gather_values(data, starts[:, places[name][0]] + places[name][1],
+                                                        places[name][2]) for name in ("red", "green", "blue")])
+            yield (indices.astype(np.int64), sides), colors
+
+    # Skips records of an unused element
+    def skip(self, props, count):
+        if all(not isinstance(kind, tuple) for name, kind in props):
+            self.file.seek(count * self.scalar_dtype(props).itemsize, os.SEEK_CUR)
+        else:
+            segments, places = self.record_layout(props)
+            for chunk in self.read_records(segments, count, CHUNK_SIZE):
+                pass
+
+
+# -------------------------------------------------------------
+# Returns values of dtype stored in byte array data at offsets.
+# lengths: values stored back to back at each offset, one each
+# if not passed, values of all offsets are returned in order
+# -------------------------------------------------------------
+def gather_values(data, offsets, dtype, lengths=None):
+    if lengths is not None:
+        firsts = np.cumsum(lengths) - lengths  # Position of each run's first value in the output
+        offsets = np.repeat(offsets - firsts * dtype.itemsize, lengths) + np.arange(lengths.sum()) * dtype.itemsize
+    values = data[offsets[:, None] + np.arange(dtype.itemsize)]
+    return values.view(dtype).ravel()
@@ -0,0 +1,159 @@
+# ------------------------------------------------------------
+# Module for the physics world. Transform and motion state of
+# every body is kept in contiguous NumPy arrays, one row per
+# body, and a physics step integrates all of them at once
+# ------------------------------------------------------------
+import numpy as np
+from funcbatch import rotation_angles_batch, rotation_matrices
+
+
+# ------------------------------------------------------------
+# PHYSICS WORLD CLASS: Structure of arrays holding every body.
+# Rows 0 to count - 1 are in use, bodies[row] is the object
+# viewing that row. Rows are packed, removing a body moves the
+# last body into its row and bumps layout
+# ------------------------------------------------------------
+class PhysicsWorld:
+    def __init__(self, drag=0.0, capacity=64):
+        self.drag = drag  # Drag given to new bodies, velocity lost per step
+
+        self.count = 0
+        self.bodies = []
+        self.layout = 0  # Bumped whenever rows are added, removed or moved
+
+        self.position = np.zeros((capacity, 3))  # x, y, z
+        self.rotation = np.zeros((capacity, 3))  # x_rot, y_rot, z_rot
+        self.scale = np.ones(capacity)
+        self.velocity = np.zeros((capacity, 3))  # Per step
+        self.angular = np.zeros((capacity, 3))  # Angular velocity, per step
+        self.drags = np.zeros(capacity)  # Velocity lost per step, on each axis
+        self.solid = np.zeros(capacity, dtype=bool)  # Has AABB collision enabled
+        self.local_min = np.zeros((capacity, 3))  # Model space bounding box, see collision.py
+        self.local_max = np.zeros((capacity, 3))
+
+        self.version = np.zeros(capacity, dtype=np.int64)  # Bumped when the transform changes
+        self.moved = np.zeros(capacity, dtype=bool)  # Position changed since take_moved
+        self.cells = np.zeros((capacity, 3), dtype=np.int64)  # Spatial index cell, kept by its owner
+
+    # Per-row arrays, resized together
+    def arrays(self):
+        return ("position", "rotation", "scale", "velocity", "angular", "drags", "solid", "local_min",
+                "local_max", "version", "moved", "cells")
+
+    # Grows arrays to hold at least capacity rows
+    def reserve(self, capacity):
+        if capacity <= len(self.scale):
+            return
+        capacity = max(capacity, len(self.scale) * 2)
+        for name in self.arrays():
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    # Adds body at rest at the origin, sets body.body to its row
+    def add(self, body):
+        self.reserve(self.count + 1)
+        row = self.count
+        for name in self.arrays():
+            getattr(self, name)[row] = 0
+        self.scale[row] = 1
+        self.drags[row] = self.drag
+
+        body.body = row
+        self.bodies.append(body)
+        self.count += 1
+        self.layout += 1
+        return row
+
+    # Removes body, moving the last body into its row
+    def remove(self, body):
+        row, last = body.body, self.count - 1
+        if row != last:
+            for name in self.arrays():
+                array = getattr(self, name)
+                array[row] = array[last]
+            moved_body = self.bodies[last]
+            self.bodies[row] = moved_body
+            moved_body.body = row
+
+        self.bodies.pop()
+        self.count -= 1
+        self.layout += 1
+        body.body = None
+
+    # Removes every body
+    def clear(self):
+        for body in self.bodies:
+            body.body = None
+        self.bodies = []
+        self.count = 0
+        self.layout += 1
+
+    # ------------------------------------------------------------
+    # Advances every body one step: moves by velocity, turns by
+    # angular velocity, then drag slows each velocity axis towards
+    # 0 without overshooting it. Turns are composed as rotation
+    # matrices, like funcmodel.rotate, so n steps of spin turn a
+    # body by R(angular) n times rather than by R(n * angular)
+    # ------------------------------------------------------------
+    def step(self):
+        n = self.count
+        velocity = self.velocity[:n]
+        angular = self.angular[:n]
+
+        moving = velocity.any(axis=1)
+        self.position[:n] += velocity
+
+        spinning = np.flatnonzero(angular.any(axis=1))
+        if len(spinning):
+            turned = rotation_matrices(angular[spinning]) @ rotation_matrices(self.rotation[spinning])
+            self.rotation[spinning] = rotation_angles_batch(turned)
+
+        self.version[:n] += moving | angular.any(axis=1)
+        self.moved[:n] |= moving
+
+        speed = np.maximum(np.abs(velocity) - self.drags[:n, None], 0)
+        np.copysign(speed, velocity, out=velocity)
+
+    # Returns rows whose position changed since last call, and clears them
+    def take_moved(self):
+        rows = np.flatnonzero(self.moved[:self.count])
+        self.moved[rows] = False
+        return rows
+
+    # Returns copy of (count, 7) transforms: x, y, z, x_rot, y_rot, z_rot, scale
+    def transforms(self):
+        n = self.count
+        return np.column_stack((self.position[:n], self.rotation[:n], self.scale[:n]))
+
+
+# -------------------------------------------------------------
+# Attribute of a body viewing one element of a PhysicsWorld
+# array. Changing a transform attribute bumps the body's version
+# so cached matrices are rebuilt, moving it marks it as moved
+# -------------------------------------------------------------
+class BodyProperty:
+    def __init__(self, array, column=None, transform=False):
+        self.array = array
+        self.column = column
+        self.transform = transform
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        array = getattr(obj.world, self.array)
+        if self.column is None:
+            return array[obj.body].item()
+        return array[obj.body, self.column].item()
+
+    def __set__(self, obj, value):
+        array = getattr(obj.world, self.array)
+        index = obj.body if self.column is None else (obj.body, self.column)
+        if array[index] == value:
+            return
+        array[index] = value
+        if self.transform:
+            obj.world.version[obj.body] += 1
+        if self.array == "position":
+            obj.world.moved[obj.body] = True
@@ -0,0 +1,98 @@
+# ------------------------------------------------------------
+# Module for the frame profiler. Stages of the main loop are
+# timed with one perf_counter call each as the frame runs, kept
+# in a ring of recent frames for the HUD panel, and optionally
+# recorded frame by frame for a CSV or JSON trace
+# ------------------------------------------------------------
+import csv
+import json
+import time
+
+import numpy as np
+
+PROFILE_STAGES = ("events", "player", "physics", "cull", "project", "sort", "raster", "hud", "flip")
+PROFILE_HISTORY = 240  # Frames kept for averages and percentiles, 4 seconds at 60 FPS
+PROFILE_PERCENTILES = (50, 95, 99)
+
+
+# -------------------------------------------------------------
+# FRAME PROFILER CLASS: Call begin_frame at the start of a
+# frame, lap(stage) as each stage finishes, and end_frame once
+# it is presented. Time between laps goes to the stage lapped,
+# so timing costs one clock read per stage
+# -------------------------------------------------------------
+class FrameProfiler:
+    def __init__(self, stages=PROFILE_STAGES, history=PROFILE_HISTORY):
+        self.stages = stages
+        self.columns = {stage: a for a, stage in enumerate(stages)}
+
+        self.history = np.zeros((history, len(stages) + 1))  # Seconds per stage then whole frame, ring
+        self.frames = 0  # Frames ended so far
+        self.current = np.zeros(len(stages) + 1)  # Stage times of the frame running
+        self.start = self.mark = time.perf_counter()
+
+        self.trace = None  # Rows of every frame while recording, see start_trace
+
+    # Starts timing a frame
+    def begin_frame(self):
+        self.current[:] = 0
+        self.start = self.mark = time.perf_counter()
+
+    # Adds time since the last lap (or begin_frame) to stage
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.current[self.columns[stage]] += now - self.mark
+        self.mark = now
+
+    # Stores finished frame in history, and in the trace if recording
+    def end_frame(self):
+        self.current[-1] = time.perf_counter() - self.start
+        self.history[self.frames % len(self.history)] = self.current
+        self.frames += 1
+
+        if self.trace is not None:
+            self.trace.append(self.current.tolist())
+
+    # ------------------------------------------------------------
+    # Returns dict of stage name (and "frame"): dict of mean, each
+    # of PROFILE_PERCENTILES as "p50" etc, and max, in milliseconds
+    # over the frames in history
+    # ------------------------------------------------------------
+    def stats(self):
+        samples = self.history[:min(self.frames, len(self.history))] * 1000
+        if len(samples) == 0:
+            samples = np.zeros((1, len(self.stages) + 1))
+
+        columns = {"mean": samples.mean(axis=0)}
+        for p, values in zip(PROFILE_PERCENTILES, np.percentile(samples, PROFILE_PERCENTILES, axis=0)):
+            columns["p%d" % p] = values
+        columns["max"] = samples.max(axis=0)
+
+        result = {}
+        for a, stage in enumerate(self.stages + ("frame",)):
+            result[stage] = {name: float(values[a]) for name, values in columns.items()}
+        return result
+
+    # Starts recording every frame for write_trace, dropping any earlier recording
+    def start_trace(self):
+        self.trace = []
+
+    # ------------------------------------------------------------
+    # Stops recording and writes trace to file_name, one row per
+    # frame of stage times in milliseconds. Written as JSON if the
+    # name ends in .json, CSV otherwise. Returns frames written
+    # ------------------------------------------------------------
+    def write_trace(self, file_name):
+        trace, self.trace = self.trace or [], None
+        header = ("frame",) + tuple("%s_ms" % stage for stage in self.stages + ("frame",))
+        rows = [[a] + [value * 1000 for value in row] for a, row in enumerate(trace)]
+
+        with open(file_name, "w", newline="") as out:
+            if file_name.endswith(".json"):
+                json.dump({"stages": list(self.stages), "frames": [dict(zip(header, row)) for row in rows]},
+                          out, indent=1)
+            else:
+                writer = csv.writer(out)
+                writer.writerow(header)
+                writer.writerows(rows)
+        return len(rows)
@@ -0,0 +1,200 @@
+# ------------------------------------------------------------
+# Module for software rasterization into NumPy buffers. Batches
+# of triangles are filled with edge functions evaluated over
+# every pixel of their spans at once, with a per-pixel depth test
+# ------------------------------------------------------------
+import numpy as np
+import pygame as pyg
+
+
+RASTER_CHUNK_PIXELS = 1 << 18  # Most bounding box pixels filled in one batch, bounds temporary arrays
+RASTER_LARGE_PIXELS = 4096  # Triangles with bounding boxes bigger than this are filled one at a time
+
+
+# Returns (groups, members) pairing each group with offsets 0..counts-1, for vectorized expansion
+def expand_counts(counts):
+    groups = np.repeat(np.arange(len(counts)), counts)
+    members = np.arange(len(groups)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return groups, members
+
+
+# ------------------------------------------------------------------
+# Fills triangles into color / depth buffers, clipped to the pixel
+# rect [x_lo, x_hi) x [y_lo, y_hi). Buffers are indexed [x, y] like
+# pygame.surfarray, depth holds half_screen_w / z (0 = empty) and a
+# pixel is written only if the triangle is nearer (larger depth).
+# Depth is linear in screen space, so it is interpolated directly
+# colors: (T, 3), points: (T, 6), depths: (T, 3), order: draw order
+#
+# Small triangles are filled in batches of about RASTER_CHUNK_PIXELS
+# bounding box pixels (see raster_batch), so they cost no Python work
+# each. Triangles bigger than RASTER_LARGE_PIXELS are filled one at
+# a time over their bounding box, which is faster per pixel
+# ------------------------------------------------------------------
+def raster_triangles(color_buf, depth_buf, colors, points, depths, order, x_lo, y_lo, x_hi, y_hi):
+    points, depths, colors = points[order], depths[order], colors[order]
+    xs, ys = points[:, 0::2], points[:, 1::2]
+
+    # Bounding box of pixel centres, clipped to rect
+    left = np.maximum(x_lo, np.ceil(xs.min(axis=1)))
+    right = np.minimum(x_hi - 1, np.floor(xs.max(axis=1)))
+    top = np.maximum(y_lo, np.ceil(ys.min(axis=1)))
+    bottom = np.minimum(y_hi - 1, np.floor(ys.max(axis=1)))
+    x1, y1, x2, y2, x3, y3 = points.T
+    area = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+
+    box_pixels = (right - left + 1) * (bottom - top + 1)
+    drawn = (left <= right) & (top <= bottom) & (area != 0)
+    tris = np.flatnonzero(drawn & (box_pixels <= RASTER_LARGE_PIXELS))
+
+    for tri in np.flatnonzero(drawn & (box_pixels > RASTER_LARGE_PIXELS)).tolist():
+        raster_large(color_buf, depth_buf, colors[tri], points[tri], depths[tri], area[tri],
+                     int(left[tri]), int(right[tri]), int(top[tri]), int(bottom[tri]))
+
+    # Batches of whole triangles
+    sizes = np.cumsum(box_pixels[tris])
+    start = 0
+    while start < len(tris):
+        done = sizes[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(sizes, done + RASTER_CHUNK_PIXELS, side="right")))
+        raster_batch(color_buf, depth_buf, colors, points, depths, area, tris[start:end],
+                     left, right, top, bottom)
+        start = end
+
+
+# Fills one triangle over its bounding box [left, right] x [top, bottom]
+def raster_large(color_buf, depth_buf, color, points, depths, area, left, right, top, bottom):
+    x1, y1, x2, y2, x3, y3 = points.tolist()
+    d1, d2, d3 = depths.tolist()
+
+    px = np.arange(left, right + 1, dtype=np.float64)[:, None]
+    py = np.arange(top, bottom + 1, dtype=np.float64)[None, :]
+
+    # Barycentric weights from edge functions, all >= 0 inside
+    w1 = ((x2 - px) * (y3 - py) - (y2 - py) * (x3 - px)) / area
+    w2 = ((x3 - px) * (y1 - py) - (y3 - py) * (x1 - px)) / area
+    w3 = 1 - w1 - w2
+    inside = (w1 >= 0) & (w2 >= 0) & (w3 >= 0)
+
+    depth = w1 * d1 + w2 * d2 + w3 * d3
+
+    region = depth_buf[left:right + 1, top:bottom + 1]
+    mask = inside & (depth > region)
+    region[mask] = depth[mask]
+    color_buf[left:right + 1, top:bottom + 1][mask] = color
+
+
+# ------------------------------------------------------------------
+# Fills triangles tris of the arrays of raster_triangles at once.
+# Each pixel row of a triangle is cut down to the span between its
+# edges, every pixel of those spans is tested with the edge
+# functions in one go, and the nearest pixel at each position is
+# kept with one scatter
+# ------------------------------------------------------------------
+def raster_batch(color_buf, depth_buf, colors, points, depths, area, tris, left, right, top, bottom):
+    height = depth_buf.shape[1]
+
+    # One row per triangle and pixel row of its bounding box
+    row_tri, row = expand_counts((bottom[tris] - top[tris] + 1).astype(np.intp))
+    row_tri = tris[row_tri]
+    py = top[row_tri] + row
+    x1, y1, x2, y2, x3, y3 = points[row_tri].T
+    row_area = area[row_tri]
+
+    # Edge functions along a row are a * px + b, inside where all are >= 0 once signed by the area
+    sign = np.sign(row_area)
+    a1, b1 = (y2 - y3) * sign, (x2 * (y3 - py) - x3 * (y2 - py)) * sign
+    a2, b2 = (y3 - y1) * sign, (x3 * (y1 - py) - x1 * (y3 - py)) * sign
+    a3, b3 = -a1 - a2, np.abs(row_area) - b1 - b2
+
+    lo, hi = left[row_tri], right[row_tri]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for a, b in ((a1, b1), (a2, b2), (a3, b3)):
+            bound = -b / a
+            lo = np.where(a > 0, np.maximum(lo, np.ceil(bound) - 1), lo)
+            hi = np.where(a < 0, np.minimum(hi, np.floor(bound) + 1), hi)
+            hi = np.where((a == 0) & (b < 0), lo - 1, hi)
+
+    # Spans are padded a pixel each side, the exact test below settles pixels on edges
+    pixel_row, step = expand_counts(np.maximum(hi - lo + 1, 0).astype(np.intp))
+    if len(pixel_row) == 0:
+        return
+    px = lo[pixel_row] + step
+    py = py[pixel_row]
+    x1, y1, x2, y2, x3, y3 = (values[pixel_row] for values in (x1, y1, x2, y2, x3, y3))
+    pixel_area = row_area[pixel_row]
+
+    # Barycentric weights from edge functions, all >= 0 inside
+    w1 = ((x2 - px) * (y3 - py) - (y2 - py) * (x3 - px)) / pixel_area
+    w2 = ((x3 - px) * (y1 - py) - (y3 - py) * (x1 - px)) / pixel_area
+    w3 = 1 - w1 - w2
+    tri = row_tri[pixel_row]
+    d1, d2, d3 = depths[tri].T
+    depth = (w1 * d1 + w2 * d2 + w3 * d3).astype(depth_buf.dtype)
+
+    index = px.astype(np.intp) * height + py.astype(np.intp)
+    depth_flat = depth_buf.reshape(-1)
+    keep = np.flatnonzero((w1 >= 0) & (w2 >= 0) & (w3 >= 0) & (depth > depth_flat[index]))
+    index, depth, tri = index[keep], depth[keep], tri[keep]
+
+    # Nearest depth of each pixel, then its color. Pixels are written last drawn
+    # first, so the first drawn of equally near triangles is written last and wins
+    np.maximum.at(depth_flat, index, depth)
+    nearest = np.flatnonzero(depth == depth_flat[index])[::-1]
+    color_buf.reshape(-1, 3)[index[nearest]] = colors[tri[nearest]]
+
+
+# Copies (width, height, 3) color buffer to surface, whole or only within pygame Rects
+def present_buffer(surface, color, rects=None):
+    if rects is None:
+        pyg.surfarray.blit_array(surface, color)
+        return
+
+    pixels = pyg.surfarray.pixels3d(surface)
+    for x, y, w, h in rects:
+        pixels[x:x + w, y:y + h] = color[x:x + w, y:y + h]
+    del pixels  # Unlocks surface
+
+
+# ------------------------------------------------------------
+# Z-BUFFER RASTER CLASS: Raster backend drawing a frame's
+# triangle list into a color buffer and a float depth buffer,
+# presented with a single surfarray blit. Occlusion is per
+# pixel, so the draw order doesn't affect the result. Meant for
+# correct occlusion rather than speed, filling pixels in NumPy
+# is slower than pygame.draw.polygon even in batches
+# ------------------------------------------------------------
+class ZBufferRaster:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.color = np.zeros((width, height, 3), dtype=np.uint8)  # Indexed [x, y]
+        self.depth = np.zeros((width, height), dtype=np.float32)  # 0 = nothing drawn
+
+        # Prefilled copy of background, a plain copy is much faster than broadcasting a color
+        self.background = np.zeros_like(self.color)
+        self.background_color = (0, 0, 0)
+
+    # Clears color buffer to background color and depth to empty, only within rects if given
+    def clear(self, bgc, rects=None):
+        if tuple(bgc) != self.background_color:
+            self.background[:] = bgc
+            self.background_color = tuple(bgc)
+
+        if rects is None:
+            np.copyto(self.color, self.background)
+            self.depth.fill(0)
+            return
+        for x, y, w, h in rects:
+            self.color[x:x + w, y:y + h] = self.background[x:x + w, y:y + h]
+            self.depth[x:x + w, y:y + h] = 0
+
+    # Draws frame triangle list, near triangles first so fewer pixels are written twice
+    def draw(self, colors, points, depths, order):
+        raster_triangles(self.color, self.depth, colors, points, depths, order[::-1],
+                         0, 0, self.width, self.height)
+
+    # Copies color buffer to surface, only within rects if given
+    def present(self, surface, rects=None):
+        present_buffer(surface, self.color, rects)
@@ -0,0 +1,214 @@
+# ------------------------------------------------------------
+# Offline renderer: draws a scene offscreen along a keyframed
+# camera path and writes every frame to a PNG sequence or a raw
+# RGB24 video file. Frames are drawn back to back as fast as the
+# CPU allows, physics steps in simulated time at the video frame
+# rate, and frames are encoded on a writer pool while the next
+# ones are drawn
+#
+# Usage: python render.py [scene] [--path FILE] [--out PATH]
+#                         [--format png|raw] [--fps N]
+# ------------------------------------------------------------
+import argparse
+import math
+import time
+
+import numpy as np
+import pygame as pyg
+
+import engine
+from framewriter import FRAME_FORMATS, FrameWriter
+from mesh import load_file
+from scheduler import FrameScheduler
+
+CAMERA_PATH_FOLDER = "paths/"  # Folder camera path files are loaded from
+ORBIT_DURATION = 10.0  # Seconds of the default path, one orbit of the scene
+
+
+# ------------------------------------------------------------
+# Returns (N, 7) keyframes from camera path file text, rows of
+# time, x, y, z, x_rot, y_rot, z_rot sorted by time. Each line
+# is one keyframe, z_rot may be left out
+# ------------------------------------------------------------
+def parse_camera_path(raw_data):
+    keys = []
+    for line in raw_data.splitlines():
+        line = line.strip()
+        if not line or line.startswith("-"):
+            continue
+
+        values = [float(value) for value in line.split(",")]
+        if len(values) == 6:
+            values.append(0.0)
+        if len(values) != 7:
+            raise ValueError("Keyframe needs time, x, y, z, x_rot, y_rot[, z_rot]: %s" % line)
+        keys.append(values)
+
+    if not keys:
+        raise ValueError("Camera path has no keyframes")
+
+    keys = np.array(keys)
+    return keys[np.argsort(keys[:, 0], kind="stable")]
+
+
+# Returns (N, 7) keyframes of camera path file name in CAMERA_PATH_FOLDER
+def load_camera_path(file_name):
+    return parse_camera_path(load_file(file_name, CAMERA_PATH_FOLDER))
+
+
+# -------------------------------------------------------------
+# Returns (N, 7) keyframes of one orbit of (cx, cy, cz) taking
+# duration seconds, one key per frame of bench.py's orbit path
+# -------------------------------------------------------------
+def orbit_path(cx, cy, cz, radius, duration=ORBIT_DURATION, keys=64):
+    angles = np.linspace(0, 2 * math.pi, keys + 1)
+    return np.column_stack((
+        np.linspace(0, duration, keys + 1),
+        cx + np.sin(angles) * radius,
+        cy + np.sin(angles * 2) * radius * 0.25,
+        cz - np.cos(angles) * radius,
+        angles,
+        np.sin(angles * 2) * 0.2,
+        np.zeros(keys + 1)))
+
+
+# --------------------------------------------------------------
+# Returns (F, 6) camera x, y, z, x_rot, y_rot, z_rot at each of
+# times, a Catmull-Rom spline through keys so the camera eases
+# through keyframes instead of turning sharply at them. Times
+# before the first or after the last key hold that key
+# --------------------------------------------------------------
+def sample_camera_path(keys, times):
+    key_times, values = keys[:, 0], keys[:, 1:]
+    times = np.clip(np.asarray(times, dtype=np.float64), key_times[0], key_times[-1])
+    if len(keys) == 1:
+        return np.repeat(values, len(times), axis=0)
+
+    # Tangent of each key from its neighbours, one-sided at the ends
+    before = np.concatenate(([0], np.arange(len(keys) - 1)))
+    after = np.concatenate((np.arange(1, len(keys)), [len(keys) - 1]))
+    spans = np.maximum(key_times[after] - key_times[before], 1e-9)
+    tangents = (values[after] - values[before]) / spans[:, None]
+
+    segment = np.clip(np.searchsorted(key_times, times, side="right") - 1, 0, len(keys) - 2)
+    length = np.maximum(key_times[segment + 1] - key_times[segment], 1e-9)
+    s = ((times - key_times[segment]) / length)[:, None]
+
+    # Cubic Hermite basis
+    h00 = 2 * s ** 3 - 3 * s ** 2 + 1
+    h10 = s ** 3 - 2 * s ** 2 + s
+    h01 = -2 * s ** 3 + 3 * s ** 2
+    h11 = s ** 3 - s ** 2
+    return (h00 * values[segment] + h10 * length[:, None] * tangents[segment] +
+            h01 * values[segment + 1] + h11 * length[:, None] * tangents[segment + 1])
+
+
+# --------------------------------------------------------------
+# Loads scene headless and renders it along camera path keys
+# ((N, 7) keyframes, default one orbit of the scene) to out,
+# returns result dict. duration defaults to the last keyframe
+# stream: stream scene cells in around the camera, every cell
+# in range is loaded before its frame is drawn
+# --------------------------------------------------------------
+def render_video(scene, out, keys=None, fps=30, width=1280, height=720, file_format="png",
+                 writers=None, raster="poly", stream=False, duration=None):
+    engine.init_display(width, height, headless=True, raster=raster)
+    if stream:
+        engine.stream_scene(scene)
+    else:
+        engine.import_scene(scene)
+
+    player = engine.player
+    if keys is None:
+        models = engine.modelList or [player]
+        cx = sum(mod.x for mod in models) / len(models)
+        cz = sum(mod.z for mod in models) / len(models)
+        radius = max(1.0, math.sqrt((player.x - cx) ** 2 + (player.z - cz) ** 2))
+        keys = orbit_path(cx, player.y, cz, radius)
+
+    if duration is None:
+        duration = keys[-1, 0] - keys[0, 0]
+    frames = max(1, int(round(duration * fps)))
+    poses = sample_camera_path(keys, keys[0, 0] + np.arange(frames) / fps)
+
+    # Physics steps in video time, not wall time, so output is the same however fast frames draw
+    engine.frame_scheduler = FrameScheduler(engine.physics_world, engine.step_physics, engine.sync_world)
+    writer = FrameWriter(out, width, height, file_format, writers)
+
+    draw_time = 0.0
+    total_polys = 0
+    start = time.perf_counter()
+
+    for x, y, z, x_rot, y_rot, z_rot in poses.tolist():
+        frame_start = time.perf_counter()
+
+        player.x, player.y, player.z = x, y, z
+        player.cam.x_rot, player.cam.y_rot, player.cam.z_rot = x_rot, y_rot, z_rot
+        player.update()
+
+        engine.frame_scheduler.begin_frame(1 / fps)
+        if engine.scene_streamer is not None:
+            engine.scene_streamer.wait()
+
+        engine.find_visible_models()
+        frame = engine.project_models()
+        total_polys += engine.raster_models(frame, engine.sort_triangles(frame))
+
+        rgb = pyg.image.tobytes(engine.screen, "RGB")
+        draw_time += time.perf_counter() - frame_start
+        writer.write(rgb)
+
+    writer.close()
+    total_time = time.perf_counter() - start
+
+    return {
+        "scene": scene,
+        "out": out,
+        "format": file_format,
+        "frames": frames,
+        "fps": fps,
+        "resolution": [width, height],
+        "video_seconds": frames / fps,
+        "render_seconds": total_time,
+        "draw_fps": frames / max(draw_time, 1e-9),
+        "export_fps": frames / total_time,
+        "realtime_factor": frames / fps / total_time,
+        "polys_per_frame": total_polys / frames,
+        "bytes_written": writer.bytes_written,
+        "ffmpeg": writer.ffmpeg_command(fps),
+    }
+
+
+# Prints result dict
+def report(result):
+    print("Scene: %s  %dx%d  %d frames at %g FPS  -> %s (%s)" % (
+        result["scene"], result["resolution"][0], result["resolution"][1], result["frames"],
+        result["fps"], result["out"], result["format"]))
+    print("Exported %.1f s of video in %.1f s, %.2fx real time" % (
+        result["video_seconds"], result["render_seconds"], result["realtime_factor"]))
+    print("Draw FPS: %.1f  export FPS: %.1f  polys/frame: %.1f  written: %.1f MB" % (
+        result["draw_fps"], result["export_fps"], result["polys_per_frame"], result["bytes_written"] / 1e6))
+    print("Encode with: %s" % result["ffmpeg"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline scene renderer")
+    parser.add_argument("scene", nargs="?", default="sceneTest", help="scene file in scenes/")
+    parser.add_argument("--path", help="camera path file in paths/, default one orbit of the scene")
+    parser.add_argument("--out", help="output folder (png) or file (raw), default render/ or render.rgb")
+    parser.add_argument("--format", choices=FRAME_FORMATS, default="png", help="PNG sequence or raw RGB24 video")
+    parser.add_argument("--fps", type=float, default=30, help="frames per second of video")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to render, default whole path")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--writers", type=int, default=None, help="PNG encoding threads, default one per CPU")
+    parser.add_argument("--raster", choices=engine.RASTER_MODES, default="poly", help="raster backend")
+    parser.add_argument("--stream", action="store_true", help="stream scene cells in around the camera")
+    args = parser.parse_args()
+
+    keys = load_camera_path(args.path) if args.path else None
+    out = args.out or ("render/" if args.format == "png" else "render.rgb")
+
+    result = render_video(args.scene, out, keys, args.fps, args.width, args.height, args.format,
+                          args.writers, args.raster, args.stream, args.duration)
+    report(result)
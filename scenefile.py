@@ -0,0 +1,319 @@
+# ------------------------------------------------------------
+# Module for scene files. Text scenes are parsed here, and can
+# be converted to an indexed binary scene whose placements are
+# grouped by spatial cell, so a loader can read just the cells
+# around the player from a memory-mapped file
+#
+# Header: magic, version, cell count, placement count, name
+#         bytes, source mtime, cell size, player x, y, z,
+#         instance count, light count
+# Names: model names, newline separated utf-8, padded to 8 bytes
+# Cells: cell count * (i, j, k, first placement, placement count)
+# Placements: placement count * PLACEMENT_DTYPE, sorted by cell
+# Instances: instance count * PLACEMENT_DTYPE, sorted by name
+# Lights: light count * LIGHT_DTYPE
+# ------------------------------------------------------------
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+from lighting import LIGHT_KINDS, LIGHT_VALUES
+
+SCENE_PATH = "scenes/"  # Folder scene files are loaded from
+SCENE_CACHE_FOLDER = ".cache/"  # Sub-folder of SCENE_PATH holding converted binary scenes
+
+SCENE_MAGIC = b"PGS1"
+SCENE_VERSION = 3
+SCENE_CELL_SIZE = 32.0  # Default size of a placement cell, in world units
+
+SCENE_HEADER = struct.Struct("<4sIIIIdd3dII4x")  # Padded to 72 bytes, keeps blocks aligned
+
+CELL_DTYPE = np.dtype([("key", "<i4", 3), ("first", "<u4"), ("count", "<u4")])
+PLACEMENT_DTYPE = np.dtype([("name", "<u4"), ("position", "<f4", 3),
+                            ("rotation", "<f4", 3), ("scale", "<f4")])
+LIGHT_DTYPE = np.dtype([("kind", "<u4"), ("values", "<f4", 5)])  # Kind is an index of LIGHT_KINDS
+
+
+# ------------------------------------------------------------
+# Returns ((x, y, z) player position, list of placements, dict
+# of instances, list of lights) from text scene data.
+# Placements are tuples of (model name, x, y, z, x_rot, y_rot,
+# z_rot, scale). Instances map model name to an (N, 7) array of
+# those transform rows, one InstanceBatch each. Lights are
+# tuples of (kind, values...) for SceneLights.add. Unknown
+# sections are skipped
+#
+# -Instances- lines are either one copy, laid out like a model
+# line, or copies scattered in a box with random turns about
+# the vertical axis:
+#  name, scatter, count, x1, y1, z1, x2, y2, z2, scale, seed
+#
+# -Lights- lines are one of:
+#  ambient, level
+#  directional, dx, dy, dz, intensity
+#  point, x, y, z, intensity, range
+# ------------------------------------------------------------
+def parse_scene(raw_data):
+    section = None
+    player = (0.0, 0.0, 0.0)
+    placements = []
+    instances = {}
+    lights = []
+
+    for line in raw_data.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("-") and line.endswith("-"):
+            section = line
+            continue
+
+        values = [value.strip() for value in line.split(",")]
+        if section == "-Player-":
+            player = tuple(float(value) for value in values[:3])
+        elif section == "-Models-":
+            placements.append((values[0],) + tuple(float(value) for value in values[1:8]))
+        elif section == "-Instances-":
+            rows = instances.setdefault(values[0], [])
+            if values[1] == "scatter":
+                rows.append(scatter_transforms(int(values[2]), [float(value) for value in values[3:6]],
+                                               [float(value) for value in values[6:9]], float(values[9]),
+                                               int(values[10]) if len(values) > 10 else 0))
+            else:
+                rows.append(np.array([[float(value) for value in values[1:8]]]))
+        elif section == "-Lights-":
+            if values[0] not in LIGHT_KINDS:
+                raise ValueError("Unknown light kind: %s" % values[0])
+            lights.append((values[0],) + tuple(float(value) for value in values[1:]))
+
+    instances = {name: np.concatenate(rows) for name, rows in instances.items()}
+    return player, placements, instances, lights
+
+
+# ---------------------------------------------------------
+# Returns (count, 7) transform rows placed uniformly in the
+# box from low to high, turned randomly about the vertical
+# axis (x_rot), all at model_scale. Same seed, same rows
+# ---------------------------------------------------------
+def scatter_transforms(count, low, high, model_scale, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((count, 7))
+    rows[:, 0:3] = rng.uniform(low, high, (count, 3))
+    rows[:, 3] = rng.uniform(0, 2 * math.pi, count)
+    rows[:, 6] = model_scale
+    return rows
+
+
+# Returns (i, j, k) placement cell holding a point
+def scene_cell(x, y, z, cell_size):
+    return (math.floor(x / cell_size), math.floor(y / cell_size), math.floor(z / cell_size))
+
+
+# ------------------------------------------------------------
+# Writes placements to indexed binary scene file, grouped by
+# cell, then instances and lights. Written to a temp file
+# first, like binary meshes
+# ------------------------------------------------------------
+def write_scene_bin(file_name, player, placements, cell_size=SCENE_CELL_SIZE, source_mtime=0, instances=None,
+                    lights=()):
+    instances = instances or {}
+    names = sorted({placement[0] for placement in placements} | set(instances))
+    name_index = {name: a for a, name in enumerate(names)}
+
+    records = np.zeros(len(placements), dtype=PLACEMENT_DTYPE)
+    if placements:
+        values = np.array([placement[1:] for placement in placements], dtype=np.float64)
+        records["name"] = [name_index[placement[0]] for placement in placements]
+        records["position"] = values[:, 0:3]
+        records["rotation"] = values[:, 3:6]
+        records["scale"] = values[:, 6]
+
+    # Sorts placements by cell so each cell is one contiguous run
+    keys = np.floor(records["position"].astype(np.float64) / cell_size).astype(np.int32)
+    order = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+    records, keys = records[order], keys[order]
+
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]) if len(keys) else np.empty(0, int)
+    cells = np.zeros(len(starts), dtype=CELL_DTYPE)
+    cells["key"] = keys[starts]
+    cells["first"] = starts
+    cells["count"] = np.diff(np.r_[starts, len(records)])
+
+    instance_records = np.zeros(sum(len(rows) for rows in instances.values()), dtype=PLACEMENT_DTYPE)
+    first = 0
+    for name in sorted(instances):
+        rows = instances[name]
+        block = instance_records[first:first + len(rows)]
+        block["name"] = name_index[name]
+        block["position"] = rows[:, 0:3]
+        block["rotation"] = rows[:, 3:6]
+        block["scale"] = rows[:, 6]
+        first += len(rows)
+
+    light_records = np.zeros(len(lights), dtype=LIGHT_DTYPE)
+    for record, (kind, *values) in zip(light_records, lights):
+        record["kind"] = LIGHT_KINDS.index(kind)
+        record["values"][:len(values)] = values
+
+    name_data = "\n".join(names).encode("utf-8")
+    name_data += b"\0" * (-len(name_data) % 8)
+
+    temp_name = file_name + ".tmp"
+    with open(temp_name, "wb") as out:
+        out.write(SCENE_HEADER.pack(SCENE_MAGIC, SCENE_VERSION, len(cells), len(records), len(name_data),
+                                    source_mtime, cell_size, *player, len(instance_records),
+                                    len(light_records)))
+        out.write(name_data)
+        out.write(cells.tobytes())
+        out.write(records.tobytes())
+        out.write(instance_records.tobytes())
+        out.write(light_records.tobytes())
+    os.replace(temp_name, file_name)
+
+
+# -------------------------------------------------------------
+# SCENE FILE CLASS: Memory-mapped indexed binary scene. Only the
+# header, names and cell index are read up front, placements of
+# a cell are read when asked for
+# -------------------------------------------------------------
+class SceneFile:
+    def __init__(self, file_name):
+        with open(file_name, "rb") as open_file:
+            self.mapping = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = SCENE_HEADER.unpack_from(self.mapping, 0)
+        magic, version, cell_count, placement_count, name_size = header[:5]
+        if magic != SCENE_MAGIC or version != SCENE_VERSION:
+            raise ValueError("Not a binary scene file: " + file_name)
+
+        self.source_mtime, self.cell_size = header[5], header[6]
+        self.player = header[7:10]
+        instance_count, light_count = header[10:12]
+
+        offset = SCENE_HEADER.size
+        names = bytes(self.mapping[offset:offset + name_size]).rstrip(b"\0").decode("utf-8")
+        self.names = names.split("\n") if names else []
+        offset += name_size
+
+        cells = np.frombuffer(self.mapping, CELL_DTYPE, cell_count, offset)
+        self.cells = {tuple(key): (first, count)
+                      for key, first, count in zip(cells["key"].tolist(), cells["first"].tolist(),
+                                                   cells["count"].tolist())}
+        offset += cells.nbytes
+
+        self.placements = np.frombuffer(self.mapping, PLACEMENT_DTYPE, placement_count, offset)
+        offset += self.placements.nbytes
+
+        self.instance_records = np.frombuffer(self.mapping, PLACEMENT_DTYPE, instance_count, offset)
+        offset += self.instance_records.nbytes
+
+        self.light_records = np.frombuffer(self.mapping, LIGHT_DTYPE, light_count, offset)
+
+    # Returns list of placements in cell key, as in parse_scene
+    def cell_placements(self, key):
+        first, count = self.cells.get(key, (0, 0))
+        records = self.placements[first:first + count]
+
+        names = [self.names[index] for index in records["name"].tolist()]
+        values = np.column_stack((records["position"], records["rotation"], records["scale"]))
+        return [(name,) + tuple(row) for name, row in zip(names, values.tolist())]
+
+    # Returns instances as in parse_scene, model name: (N, 7) transform rows
+    def instances(self):
+        records = self.instance_records
+        rows = np.column_stack((records["position"], records["rotation"], records["scale"])).astype(np.float64)
+
+        names = records["name"]
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]]) if len(names) else []
+        ends = list(starts[1:]) + [len(names)]
+        return {self.names[names[start]]: rows[start:end] for start, end in zip(starts, ends)}
+
+    # Returns lights as in parse_scene, (kind, values...) tuples
+    def lights(self):
+        lights = []
+        for kind, values in zip(self.light_records["kind"].tolist(), self.light_records["values"].tolist()):
+            lights.append((LIGHT_KINDS[kind],) + tuple(values[:LIGHT_VALUES[kind]]))
+        return lights
+
+    # -----------------------------------------------------------
+    # Returns keys of stored cells overlapping the box around a
+    # sphere. Looks up each cell of the box, or filters the index
+    # when it holds fewer cells than the box covers
+    # -----------------------------------------------------------
+    def cells_near(self, x, y, z, radius):
+        lo = scene_cell(x - radius, y - radius, z - radius, self.cell_size)
+        hi = scene_cell(x + radius, y + radius, z + radius, self.cell_size)
+
+        if math.prod(h - l + 1 for l, h in zip(lo, hi)) > len(self.cells):
+            return [key for key in self.cells
+                    if lo[0] <= key[0] <= hi[0] and lo[1] <= key[1] <= hi[1] and lo[2] <= key[2] <= hi[2]]
+
+        return [(i, j, k) for i in range(lo[0], hi[0] + 1) for j in range(lo[1], hi[1] + 1)
+                for k in range(lo[2], hi[2] + 1) if (i, j, k) in self.cells]
+
+
+# ---------------------------------------------
+# Returns path of binary cache file for a scene
+# ---------------------------------------------
+def cached_scene_name(name, path=SCENE_PATH):
+    return path + SCENE_CACHE_FOLDER + name + ".pgs"
+
+
+# Reads and parses text scene file, skipping comment lines
+def read_scene(name, path=SCENE_PATH):
+    with open(path + name, "r") as open_file:
+        raw_data = "".join(line for line in open_file if "#" not in line)
+    return parse_scene(raw_data)
+
+
+# -------------------------------------------------------------
+# Converts text scene to the indexed binary format, text file
+# stays the source. Returns name of written binary file
+# -------------------------------------------------------------
+def convert_scene(name, path=SCENE_PATH, cell_size=SCENE_CELL_SIZE):
+    mtime = os.path.getmtime(path + name)
+    player, placements, instances, lights = read_scene(name, path)
+
+    bin_name = cached_scene_name(name, path)
+    os.makedirs(os.path.dirname(bin_name), exist_ok=True)
+    write_scene_bin(bin_name, player, placements, cell_size, mtime, instances, lights)
+    return bin_name
+
+
+# -------------------------------------------------------------
+# Returns SceneFile for a scene, converting the text scene first
+# if the binary one is missing or older than it. A scene with
+# no text source is opened as it is
+# -------------------------------------------------------------
+def open_scene(name, path=SCENE_PATH):
+    bin_name = cached_scene_name(name, path)
+
+    if os.path.exists(path + name):
+        scene = None
+        if os.path.exists(bin_name):
+            try:
+                scene = SceneFile(bin_name)
+            except (ValueError, struct.error):
+                scene = None
+
+        if scene is None or scene.source_mtime != os.path.getmtime(path + name):
+            convert_scene(name, path)
+            scene = SceneFile(bin_name)
+        return scene
+
+    return SceneFile(bin_name)
+
+
+# Converts scene files to binary: python scenefile.py [scene names], default all
+if __name__ == "__main__":
+    import sys
+
+    names = sys.argv[1:]
+    if not names:
+        names = [name for name in sorted(os.listdir(SCENE_PATH))
+                 if os.path.isfile(SCENE_PATH + name)]
+
+    for name in names:
+        print(name, "->", convert_scene(name))
@@ -0,0 +1,175 @@
+# ------------------------------------------------------------
+# Module for the frame scheduler. Physics runs at a fixed rate
+# whatever the frame rate, and frames are drawn from snapshots
+# of model transforms blended between the last two steps. The
+# next frame's steps can run on a worker thread while the
+# current frame is projected and rasterized
+# ------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from funcbatch import *
+
+PHYSICS_RATE = 60  # Physics steps per second
+MAX_STEPS = 8  # Most steps run for one frame, so a long stall doesn't spiral
+
+
+# ------------------------------------------------------------
+# TRANSFORM SNAPSHOT CLASS: Copy of every body's transform in a
+# PhysicsWorld at one physics step, (N, 7) rows of x, y, z,
+# x_rot, y_rot, z_rot, scale. Never changed once taken, so the
+# render side can read it while the next step is simulated
+# ------------------------------------------------------------
+class TransformSnapshot:
+    def __init__(self, world):
+        self.bodies = list(world.bodies)
+        self.layout = world.layout  # Snapshots with equal layout have equal rows
+        self.state = world.transforms()
+        self.versions = world.version[:world.count].copy()  # Transform version of each row
+
+    # Returns row of body, None if it wasn't in the world when taken
+    def row_of(self, body):
+        row = body.body
+        if row is not None and row < len(self.bodies) and self.bodies[row] is body:
+            return row
+        return None
+
+
+# ---------------------------------------------------------------
+# Returns (N, 3, 4) model matrices blended between two snapshots,
+# alpha 0 = previous, 1 = current. Position and scale are blended
+# linearly, orientation by slerp of quaternions, since the angles
+# of a spinning body wrap and flip between steps. Falls back to
+# current if bodies were added or removed between them
+# ---------------------------------------------------------------
+def blend_snapshots(previous, current, alpha):
+    matrices = transform_matrices(current.state)
+    if previous is None or previous.layout != current.layout or alpha >= 1:
+        return matrices
+
+    rows = np.flatnonzero((previous.state != current.state).any(axis=1))
+    if len(rows) == 0:
+        return matrices
+
+    before, after = previous.state[rows], current.state[rows]
+    turns = slerp_quaternions(rotation_quaternions(rotation_matrices(before[:, 3:6])),
+                              rotation_quaternions(rotation_matrices(after[:, 3:6])), alpha)
+    scale = before[:, 6] + (after[:, 6] - before[:, 6]) * alpha
+    matrices[rows, :, :3] = quaternion_matrices(turns) * scale[:, None, None]
+    matrices[rows, :, 3] = before[:, 0:3] + (after[:, 0:3] - before[:, 0:3]) * alpha
+    return matrices
+
+
+# -------------------------------------------------------------
+# FRAME SCHEDULER CLASS: Runs step() once per fixed physics
+# step and keeps the last two snapshots of world for drawing
+# world: PhysicsWorld holding the bodies to snapshot
+# step: advances the simulation one fixed step, velocities are
+#  per step so physics runs at the same speed at any frame rate
+# sync: called on the main thread after each simulation finishes,
+#  before the next one starts, for state frames read (scene_grid)
+# pipelined: simulate on a worker thread, overlapping the frame
+#  that is drawn meanwhile. Drawn frames then lag the simulation
+#  by one frame
+# -------------------------------------------------------------
+class FrameScheduler:
+    def __init__(self, world, step, sync=None, rate=PHYSICS_RATE, pipelined=False):
+        self.world = world
+        self.step = step
+        self.sync = sync
+        self.step_time = 1.0 / rate
+        self.pipelined = pipelined
+
+        self.accumulator = 0.0  # Simulated time owed, less than one step after advance
+        self.steps = 0  # Steps run so far
+
+        # Double-buffered snapshots: the simulation writes one pair, frames read the other
+        self.sim_snapshots = (None, TransformSnapshot(world))
+        self.frame_snapshots = self.sim_snapshots
+        self.sim_alpha = 0.0
+        self.alpha = 0.0  # Blend of frame_snapshots to draw
+
+        self.matrices = None  # (N, 3, 4) blended model matrices of the current frame
+        self.blending = None  # (N,) bool, rows that differ between frame_snapshots
+        self.executor = ThreadPoolExecutor(1) if pipelined else None
+        self.pending = None  # Future of the simulation running on the worker
+
+    # Runs the steps owed after frame_time seconds, snapshotting after each
+    def advance(self, frame_time):
+        self.accumulator += min(frame_time, MAX_STEPS * self.step_time)
+
+        previous, current = self.sim_snapshots
+        while self.accumulator >= self.step_time:
+            self.step()
+            self.accumulator -= self.step_time
+            self.steps += 1
+            previous, current = current, TransformSnapshot(self.world)
+
+        self.sim_snapshots = (previous, current)
+        self.sim_alpha = self.accumulator / self.step_time
+
+    # ------------------------------------------------------------
+    # Starts a frame frame_time seconds after the last one. Waits
+    # for the simulation in flight, publishes its snapshots to the
+    # frame, then starts simulating the next frame. Returns blend
+    # ------------------------------------------------------------
+    def begin_frame(self, frame_time):
+        if self.pipelined:
+            if self.pending is not None:
+                self.pending.result()
+            self.publish()
+            self.pending = self.executor.submit(self.advance, frame_time)
+        else:
+            self.advance(frame_time)
+            self.publish()
+        return self.alpha
+
+    # Makes the finished simulation snapshots the ones frames are drawn from
+    def publish(self):
+        if self.sync is not None:
+            self.sync()
+        self.frame_snapshots = self.sim_snapshots
+        self.alpha = self.sim_alpha
+        self.matrices = None
+        self.blending = None
+
+    # Returns blended 3x4 model-to-world matrix of body for this frame, None if not snapshotted
+    def model_matrix(self, body):
+        previous, current = self.frame_snapshots
+        row = current.row_of(body)
+        if row is None:
+            return None
+
+        if self.matrices is None:
+            self.matrices = blend_snapshots(previous, current, self.alpha)
+        return self.matrices[row]
+
+    # ------------------------------------------------------------
+    # Returns key that changes whenever the blended matrix of body
+    # changes: its transform version, with the blend added while
+    # it moves between snapshots. None if not snapshotted
+    # ------------------------------------------------------------
+    def frame_version(self, body):
+        previous, current = self.frame_snapshots
+        row = current.row_of(body)
+        if row is None:
+            return None
+
+        if self.blending is None:
+            if previous is None or previous.layout != current.layout:
+                self.blending = np.zeros(len(current.versions), dtype=bool)
+            else:
+                self.blending = previous.versions != current.versions
+
+        version = int(current.versions[row])
+        if self.blending[row]:
+            return version, self.alpha
+        return version
+
+    # Waits for the simulation in flight and stops the worker
+    def close(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -0,0 +1,155 @@
+# ------------------------------------------------------------
+# Module for the scene spatial index. Models are bucketed into
+# a uniform grid of cubic cells by their position, so queries
+# only look at cells near the camera instead of every model
+# ------------------------------------------------------------
+import math
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+# UNIFORM GRID CLASS: Hash of cell key -> models in that cell.
+# A model is stored in the cell holding its position; queries
+# widen by the largest model radius so big models aren't missed
+# ------------------------------------------------------------
+class UniformGrid:
+    def __init__(self, cell_size=8.0):
+        self.cell_size = cell_size
+        self.cells = {}  # (i, j, k) -> set of models
+        self.max_radius = 0.0  # Largest bounding radius of any inserted model
+
+    # Returns key of cell holding a point
+    def cell_of(self, x, y, z):
+        size = self.cell_size
+        return (math.floor(x / size), math.floor(y / size), math.floor(z / size))
+
+    # Returns radius around model position holding all of its mesh
+    def model_radius(self, model):
+        return model.mesh.origin_radius * abs(model.scale)
+
+    # Adds model to grid
+    def insert(self, model):
+        key = self.cell_of(model.x, model.y, model.z)
+        self.cells.setdefault(key, set()).add(model)
+        model.grid_cell = key
+        self.max_radius = max(self.max_radius, self.model_radius(model))
+
+    # Removes model from grid
+    def remove(self, model):
+        cell = self.cells.get(model.grid_cell)
+        if cell is not None:
+            cell.discard(model)
+            if not cell:
+                del self.cells[model.grid_cell]
+        model.grid_cell = None
+
+    # Moves model to its new cell, call after it has moved or been scaled
+    def update(self, model):
+        key = self.cell_of(model.x, model.y, model.z)
+        if key != model.grid_cell:
+            self.remove(model)
+            self.insert(model)
+        else:
+            self.max_radius = max(self.max_radius, self.model_radius(model))
+
+    # Removes every model
+    def clear(self):
+        self.cells = {}
+        self.max_radius = 0.0
+
+    # Returns keys of occupied cells overlapping the box around a sphere
+    def cells_near(self, x, y, z, radius):
+        lo_i, lo_j, lo_k = self.cell_of(x - radius, y - radius, z - radius)
+        hi_i, hi_j, hi_k = self.cell_of(x + radius, y + radius, z + radius)
+
+        # Walks whichever is smaller, the box of cells or the occupied cells
+        box_cells = (hi_i - lo_i + 1) * (hi_j - lo_j + 1) * (hi_k - lo_k + 1)
+        if box_cells > len(self.cells):
+            return [key for key in self.cells
+                    if lo_i <= key[0] <= hi_i and lo_j <= key[1] <= hi_j and lo_k <= key[2] <= hi_k]
+
+        keys = []
+        for i in range(lo_i, hi_i + 1):
+            for j in range(lo_j, hi_j + 1):
+                for k in range(lo_k, hi_k + 1):
+                    if (i, j, k) in self.cells:
+                        keys.append((i, j, k))
+        return keys
+
+    # Returns models whose bounding sphere may be within radius of a point
+    def query_sphere(self, x, y, z, radius):
+        models = []
+        for key in self.cells_near(x, y, z, radius + self.max_radius):
+            models.extend(self.cells[key])
+        return models
+
+    # ------------------------------------------------------------
+    # Returns models within radius of (x, y, z) whose cell is not
+    # fully outside one of planes, (P, 4) world planes (a, b, c, d)
+    # with a * x + b * y + c * z + d >= 0 for points inside
+    # ------------------------------------------------------------
+    def query_frustum(self, planes, x, y, z, radius):
+        keys = self.cells_near(x, y, z, radius + self.max_radius)
+        if not keys:
+            return []
+
+        # Cell bounding spheres, grown by the largest model radius
+        size = self.cell_size
+        centers = (np.array(keys, dtype=np.float64) + 0.5) * size
+        cell_radius = size * math.sqrt(3) / 2 + self.max_radius
+
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        inside = (distances >= -cell_radius).all(axis=1)
+
+        models = []
+        for key, keep in zip(keys, inside.tolist()):
+            if keep:
+                models.extend(self.cells[key])
+        return models
+
+    # -------------------------------------------------------------
+    # Returns (model, distance) of nearest model whose bounding
+    # sphere is hit by ray from origin along unit direction, within
+    # max_dist, or (None, max_dist). Steps along the ray one cell
+    # at a time, testing models near each step
+    # -------------------------------------------------------------
+    def raycast(self, origin, direction, max_dist):
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+
+        nearest, nearest_dist = None, max_dist
+        tested = set()
+        step = self.cell_size
+        reach = step * math.sqrt(3) / 2
+
+        travelled = 0.0
+        while travelled <= nearest_dist + step:
+            point = origin + direction * travelled
+            for model in self.query_sphere(point[0], point[1], point[2], reach):
+                if model in tested:
+                    continue
+                tested.add(model)
+
+                hit = ray_sphere(origin, direction, model.sphere_center(), model.mesh.radius * abs(model.scale))
+                if hit is not None and hit < nearest_dist:
+                    nearest, nearest_dist = model, hit
+            travelled += step
+
+        return nearest, nearest_dist
+
+
+# ---------------------------------------------------------------
+# Returns distance along unit ray to a sphere, None if it misses
+# ---------------------------------------------------------------
+def ray_sphere(origin, direction, center, radius):
+    offset = center - origin
+    along = offset @ direction
+    closest_sq = offset @ offset - along * along
+    if closest_sq > radius * radius:
+        return None
+
+    half_chord = math.sqrt(radius * radius - closest_sq)
+    if along + half_chord < 0:
+        return None
+    return max(0.0, along - half_chord)
@@ -0,0 +1,125 @@
+# ------------------------------------------------------------
+# Module for streaming scene cells. Placements of the cells
+# around a point are read from a SceneFile on a background
+# thread, and objects are created for them on the main thread
+# once read. Cells left far enough behind are unloaded again,
+# so only the neighbourhood of the player is ever in memory
+# ------------------------------------------------------------
+import queue
+import threading
+
+from scenefile import scene_cell
+
+STREAM_CELLS_PER_UPDATE = 4  # Most read cells turned into objects by one update
+
+
+# -------------------------------------------------------------
+# SCENE STREAMER CLASS: Keeps the cells of scene within
+# load_radius of the point given to update loaded, and unloads
+# cells once they are past unload_radius. The gap between the
+# radii stops cells on the edge loading and unloading each frame
+# scene: SceneFile to read placements from
+# place: creates the object of one placement, main thread only
+# unload: removes an object made by place, main thread only
+# preload: called on the worker with the model names of a cell
+#  before it is handed over, so their files are read off the
+#  main thread (mesh_cache)
+# -------------------------------------------------------------
+class SceneStreamer:
+    def __init__(self, scene, place, unload, load_radius, unload_radius=None, preload=None,
+                 cells_per_update=STREAM_CELLS_PER_UPDATE):
+        self.scene = scene
+        self.place = place
+        self.unload = unload
+        self.preload = preload
+        self.load_radius = load_radius
+        self.unload_radius = max(unload_radius or 0, load_radius + scene.cell_size)
+        self.cells_per_update = cells_per_update
+
+        self.loaded = {}  # Cell key: objects placed for it
+        self.requested = set()  # Cells sent to the worker and not yet placed
+        self.wanted = frozenset()  # Cells within load_radius at the last update, read by the worker
+        self.center = None  # Cell of the point given to the last update
+
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.read_cells, daemon=True)
+        self.thread.start()
+
+    # Worker loop: reads placements of requested cells until given None
+    def read_cells(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                self.requests.task_done()
+                return
+
+            placements = None  # Cell no longer wanted, skipped
+            if key in self.wanted:
+                placements = self.scene.cell_placements(key)
+                if self.preload is not None:
+                    self.preload({placement[0] for placement in placements})
+
+            self.results.put((key, placements))
+            self.requests.task_done()
+
+    # ------------------------------------------------------------
+    # Streams cells around point (x, y, z), call once per frame
+    # on the main thread. Requests missing cells, places cells the
+    # worker finished reading and unloads cells left behind
+    # ------------------------------------------------------------
+    def update(self, x, y, z):
+        center = scene_cell(x, y, z, self.scene.cell_size)
+        if center != self.center:
+            self.center = center
+            self.wanted = frozenset(self.scene.cells_near(x, y, z, self.load_radius))
+            for key in self.wanted:
+                if key not in self.loaded and key not in self.requested:
+                    self.requested.add(key)
+                    self.requests.put(key)
+
+            keep = set(self.scene.cells_near(x, y, z, self.unload_radius))
+            for key in [key for key in self.loaded if key not in keep]:
+                for obj in self.loaded.pop(key):
+                    self.unload(obj)
+
+        self.place_cells(self.cells_per_update)
+
+    # Places up to limit cells the worker finished reading, all of them if limit is None
+    def place_cells(self, limit=None):
+        placed = 0
+        while limit is None or placed < limit:
+            try:
+                key, placements = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            self.requested.discard(key)
+            if placements is None:
+                # Skipped while out of range, but wanted again since
+                if key in self.wanted and key not in self.loaded:
+                    self.requested.add(key)
+                    self.requests.put(key)
+            elif key in self.wanted and key not in self.loaded:
+                self.loaded[key] = [self.place(placement) for placement in placements]
+                placed += 1
+
+    # Blocks until every requested cell is read, then places them all
+    def wait(self):
+        while self.requested:
+            self.requests.join()
+            self.place_cells()
+
+    # Count of objects currently placed
+    def object_count(self):
+        return sum(len(objects) for objects in self.loaded.values())
+
+    # Stops the worker, and unloads every placed object unless the caller clears them itself
+    def close(self, unload=True):
+        self.requests.put(None)
+        self.thread.join()
+        for objects in self.loaded.values() if unload else ():
+            for obj in objects:
+                self.unload(obj)
+        self.loaded = {}
+        self.requested = set()